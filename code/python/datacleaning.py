@@ -5,52 +5,21 @@ Created on Tue Mar 28 13:33:19 2023
 @author: Mario
 """
 
+import re
+import sys
+import types
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
-df = pd.read_excel("C:/Users/Mario/Documents/UN/03. Research Group/01. CBD/zuap_survey.xlsx")
-
-#Non informative columns that won´t be considered in the analysis
-
-col_out = ['id', 'db', 'Marca temporal', 'Correo electrónico', 'Teléfono de contacto',
-           '¿En su empresa o comercio cuentan con colaboradoras mujeres?',
-           'Porcentaje mujeres','% mujeres en la distribución','% mujeres vinculadas','Ir al fin de la encuesta.',
-           'De acuerdo con el tipo de carga que distribuye su empresa, indique máximo 3 tipos en el siguiente listado:',
-           '¿El origen de la mercancía que transporta es el Valle de Aburrá?',
-           'Por favor, indique el municipio:',
-           'Por favor, indique cuántas entregas hace en el centro de Medellín al día:',
-           'Por favor, indique el número de establecimientos que surte en el centro de Medellín a diario:',
-           '¿Cuántos pedidos recibe su empresa diariamente que tienen como destino el centro de Medellín?',
-           'Por favor indique la cantidad de vehículos con combustión a diésel (ACPM) con los que cuenta su empresa:',
-           'Por favor indique la cantidad de vehículos con combustión a gasolina con los que cuenta su empresa:',
-           'Por favor indique la cantidad de vehículos con combustión a gas natural vehicular (GNV) con los que cuenta su empresa:',
-           'Por favor indique la cantidad de vehículos con motor eléctrico con los que cuenta su empresa:',
-           'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos anteriores a 1990]',
-           'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos entre 1991 y 2000]',
-           'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos entre 2001 y 2010]',
-           'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos entre 2011 y 2015]',
-           'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos del 2016 en adelante]',
-           '¿Cuánto es el rendimiento en galones/kilómetro, de sus vehículos a ACPM?',
-           '¿Cuánto es el rendimiento en galones/kilómetro, de sus vehículos a gasolina?',
-           '¿Cuánto es el rendimiento en metros cúbicos/kilómetro, de sus vehículos a GNV?',
-           '¿Cuánto es el rendimiento kilowatt-hora, de sus vehículos eléctricos?',
-           '¿Cuánto es el costo total por movilizar un camión cargado hacia el centro de Medellín?',
-           '¿Cuántas horas al volante permanece durante un turno de reparto una/un conductora/or en su empresa?',
-           'De acuerdo con la siguiente escala, donde 1 es "Muy compleja" y 5 es "Muy adecuada" ¿Cómo considera la relación de sus conductores con los demás actores viales (peatones, ciclistas, conductores, transporte público) en el espacio público de la ZUAP?',
-           '¿Al interior de su empresa se realizan actividades que promuevan la actividad física entre sus calaboradoras/es?',
-           '¿Qué actividades se realizan?',
-           '¿Cuántas veces por semana se realizan actividades para promover la actividad física?',
-           '¿Conoce usted el Decreto No 1790 de noviembre 20 de 2012 (Decreto de Zona Amarilla o de cargue y descargue en el centro de la ciudad)?']
-
-df = df.drop(col_out, axis = 1)
-
-#Lowercase column names
-
-df.columns = df.columns.str.lower()
+RAW_PATH = "C:/Users/Mario/Documents/UN/03. Research Group/01. CBD/zuap_survey.xlsx"
+OUT_PATH = 'clean_survey.parquet'
 
 #Change variables names for facility
 
-c_ch = {'nombre de la empresa': 'company', 
+C_CH = types.MappingProxyType({'nombre de la empresa': 'company', 
         'dirección de la empresa': 'address',
         'por favor indique el número de colaboradores que tiene su empresa o comercio': 'employees',
         'por favor indique el número de mujeres que trabajan en su empresa o comercio': 'women_employees',
@@ -79,93 +48,157 @@ c_ch = {'nombre de la empresa': 'company',
         '¿qué medio realiza para el envío de sus artículos a domicilio?': 'delivery_mean',
         '¿cuántos domicilios realiza a diario su establecimiento?': 'num_delivery',
         '¿qué medio realiza para el envío de sus ventas por internet?': 'online_mean',
-        '¿cuántos envíos de artículos vendidos por internet realiza a diario su establecimiento?': 'num_online'}
-
-df = df.rename(columns = c_ch)
-
-###############Woman category
+        '¿cuántos envíos de artículos vendidos por internet realiza a diario su establecimiento?': 'num_online'})
 
 #Keep main economic activity
 
 values2 = ['Fabricante', 'Proveedor', 'Venta al detalle', 'Ventas por internet', 'Transportador']
 
-conditions2 = list(map(df['economic_activity'].str.contains, values2))
+ACTIVITY_RE = re.compile('(' + '|'.join(map(re.escape, values2)) + ')')
 
-df['economic_activity2'] = np.select(conditions2, values2, None)
+#Tuesday to Thursday are the typical supply days
 
-#Storage type
+TYPDAY_RE = re.compile('Martes|Miércoles|Jueves')
 
-df['storage_type'] = df['storage_type'].replace({'Otro ¿cuál?': np.nan})
+#Typical vehicle used on the supply
 
-#Create a column to identify the supply on typical days
+ENTRANCE_MAP = {'truck_supply': 'camion',
+                'moto_supply': 'motocicleta',
+                'bike_supply': 'bicicleta',
+                'wagon_supply': 'carreta',
+                'auto_supply': 'particular'}
 
-cond1 = df['supply_day'].str.contains('Martes')
-cond2 = df['supply_day'].str.contains('Miércoles')
-cond3 = df['supply_day'].str.contains('Jueves')
+#Truck's unloading in the ZUAP zone
 
-df['typday_supply'] = np.where(cond1, 1, np.where(cond2, 1, np.where(cond3, 1, 0)))
+UNLOAD_MAP = {'internal_truck_un': 'internamente',
+              'bay_truck_un': 'transportadora',
+              'bay_personal_truck_un': 'empresa',
+              'road_truck_un': 'via',
+              'sidewalk_truck_un': 'anden',
+              'near_road_truck_un': 'aledanas',
+              'parklot_truck_un': 'propiedad'}
 
-#Determine the typical schedules within ZUAP
+#Equipement to load/unload in the establishment or in the storage area
 
-df['supply_schedule'] = df['supply_schedule'].str.replace(':00', '')
+STORAGE_MAP = {'wagon_storage': 'carretilla',
+               'elevator_storage': 'elevador',
+               'mecramp_storage': 'rampa mecanica',
+               'fixramp_storage': 'rampa fija',
+               'intparking_storage': 'interno',
+               'custparking_storage': 'clientes'}
 
-##########Revisar los horarios con más detalle
+#Load the survey from a Parquet copy next to the xlsx, parsing the workbook only once
 
-#Typical vehicle used on the supply
+def _convert(xlsx_path, pq_path, usecols):
+    df = pd.read_excel(xlsx_path, engine='calamine', usecols=usecols)
+    #Free-text answers mix numbers and strings, which Arrow cannot store in one column
+    obj = df.select_dtypes('object').columns
+    df[obj] = df[obj].apply(lambda c: c.where(c.isna(), c.astype(str)))
+    df.to_parquet(pq_path, engine='pyarrow', compression='zstd')
+    return df
 
-cond4 = df['supply_entrance'].str.contains('camión')
-cond5 = df['supply_entrance'].str.contains('motocicleta')
-cond6 = df['supply_entrance'].str.contains('bicicleta')
-cond7 = df['supply_entrance'].str.contains('carreta')
-cond8 = df['supply_entrance'].str.contains('particular')
+def load(xlsx_path, usecols=None):
+    xlsx_path = Path(xlsx_path)
+    pq_path = xlsx_path.with_suffix('.parquet')
+    if pq_path.exists() and pq_path.stat().st_mtime >= xlsx_path.stat().st_mtime:
+        return pd.read_parquet(pq_path)
+    return _convert(xlsx_path, pq_path, usecols)
 
-df['truck_supply'] = np.where(cond4, 1, 0)
-df['moto_supply'] = np.where(cond5, 1, 0)
-df['bike_supply'] = np.where(cond6, 1, 0)
-df['wagon_supply'] = np.where(cond7, 1, 0)
-df['auto_supply'] = np.where(cond8, 1, 0)
+#Flag each multi-select option with one int8 column, one keyword per flag.
+#The distinct answers are split into their options once with get_dummies and
+#a keyword is matched against the option names; rows are gathered back by code.
+#Options are accent-stripped and lower-cased, so keywords are plain ASCII
+#and answers typed without accents (e.g. 'camion') still match.
 
-#Truck's unloading in the ZUAP zone
+def ascii_lower(s):
+    return s.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
 
-cond9 = df['supply_entrance'].str.contains('internamente')
-cond10 = df['supply_entrance'].str.contains('transportadora')
-cond11 = df['supply_entrance'].str.contains('empresa')
-cond12 = df['supply_entrance'].str.contains('vía')
-cond13 = df['supply_entrance'].str.contains('andén')
-cond14 = df['supply_entrance'].str.contains('aledañas')
-cond15 = df['supply_entrance'].str.contains('propiedad')
-
-df['internal_truck_un'] = np.where(cond9, 1, 0)
-df['bay_truck_un'] = np.where(cond10, 1, 0)
-df['bay_personal_truck_un'] = np.where(cond11, 1, 0)
-df['road_truck_un'] = np.where(cond12, 1, 0)
-df['sidewalk_truck_un'] = np.where(cond13, 1, 0)
-df['near_road_truck_un'] = np.where(cond14, 1, 0)
-df['parklot_truck_un'] = np.where(cond15, 1, 0)
+def flag_columns(s, keywords, out):
+    options = pd.Series(ascii_lower(s.cat.categories)).str.get_dummies(sep=',')
+    #Category x keyword table, then one gather fills every flag of every row
+    table = np.column_stack([options.loc[:, options.columns.str.contains(kw, regex=False)].any(axis=1)
+                             for kw in keywords]).astype(np.int8)
+    #Missing and non-text answers (e.g. the number 1) flag 0. The first version
+    #passed the NaN from str.contains to np.where, which read it as true and set 1.
+    codes = s.cat.codes.to_numpy()
+    valid = codes >= 0
+    out[valid] = table[codes[valid]]
 
-#Equipement to load/unload in the establishment or in the storage area
+def clean(df):
+
+    #Lowercase column names
+
+    df = df.rename(columns = str.lower)
+
+    df = df.rename(columns = C_CH)
+
+    #Survey multi-selects repeat a handful of answers, store them as categories
+
+    for c in ['supply_entrance', 'storage_equipement', 'supply_day', 'economic_activity', 'delivery_mean']:
+        df[c] = df[c].astype('category')
+
+    #Storage type
+
+    df['storage_type'] = df['storage_type'].replace({'Otro ¿cuál?': np.nan})
+
+    #Determine the typical schedules within ZUAP
+
+    #Arrow-backed strings so the replace runs in Arrow's replace_substring kernel
+
+    df['supply_schedule'] = df['supply_schedule'].astype('string[pyarrow]').str.replace(':00', '', regex=False)
+
+    ##########Revisar los horarios con más detalle
+
+    #Correct the number of delivery based on the establishment answer
+
+    cond23 = df['delivery_mean'].str.contains('No se realizan', regex=False, na=False)
+
+    #All flags are written into one preallocated int8 matrix and wrapped once
+
+    entrance_map = {**ENTRANCE_MAP, **UNLOAD_MAP}
+    flag_names = ['typday_supply', *entrance_map, *STORAGE_MAP]
+    flags = np.zeros((len(df), len(flag_names)), dtype=np.int8)
+
+    #Create a column to identify the supply on typical days
+
+    flags[:, 0] = df['supply_day'].str.contains(TYPDAY_RE, na=False).to_numpy(dtype=np.int8)
+    flag_columns(df['supply_entrance'], entrance_map.values(), flags[:, 1:1 + len(entrance_map)])
+    flag_columns(df['storage_equipement'], STORAGE_MAP.values(), flags[:, 1 + len(entrance_map):])
+
+    new_cols = [df['economic_activity'].str.extract(ACTIVITY_RE, expand=False).rename('economic_activity2'),
+                pd.DataFrame(flags, index=df.index, columns=flag_names, copy=False),
+                df['num_delivery'].where(~cond23, 0).rename('num_delivery_corrected')]
+
+    return pd.concat([df, *new_cols], axis=1, copy=False)
+
+def save(df, out):
+
+    #Smallest integer types, and categories for text that repeats across rows
+
+    ints = df.select_dtypes('integer').columns
+    text = [c for c in df.select_dtypes('object').columns if df[c].nunique() <= len(df) // 2]
+    df = df.assign(**{c: pd.to_numeric(df[c], downcast='integer') for c in ints},
+                   **{c: df[c].astype('category') for c in text})
+
+    #Typed, compressed output without the RangeIndex column
 
-cond16 = df['storage_equipement'].str.contains('Carretilla')
-cond17 = df['storage_equipement'].str.contains('Elevador')
-cond18 = df['storage_equipement'].str.contains('Rampa mecánica')
-cond19 = df['storage_equipement'].str.contains('Rampa fija')
-cond20 = df['storage_equipement'].str.contains('Porta doble')
-cond21 = df['storage_equipement'].str.contains('interno')
-cond22 = df['storage_equipement'].str.contains('clientes')
+    df.to_parquet(out, engine='pyarrow', compression='zstd', index=False)
 
-df['wagon_storage'] = np.where(cond16, 1, 0)
-df['elevator_storage'] = np.where(cond17, 1, 0)
-df['mecramp_storage'] = np.where(cond18, 1, 0)
-df['fixramp_storage'] = np.where(cond19, 1, 0)
-df['intparking_storage'] = np.where(cond21, 1, 0)
-df['custparking_storage'] = np.where(cond22, 1, 0)
+#Each survey file is read and cleaned independently, so several files run in parallel
 
-#Correct the number of delivery based on the establishment answer
+def keep_column(col):
+    return col.lower() in C_CH
 
-cond23 = df['delivery_mean'].str.contains('No se realizan')
+def load_and_clean(xlsx_path):
+    #Only the renamed columns are read; the non informative ones never leave the workbook
+    return clean(load(xlsx_path, usecols=keep_column))
 
-df['delivery_mean_correct'] = np.where(cond23, 1, 0)
+def clean_many(paths):
+    if len(paths) == 1:
+        return load_and_clean(paths[0])
+    with ProcessPoolExecutor() as executor:
+        return pd.concat(executor.map(load_and_clean, paths), ignore_index=True)
 
-df['num_delivery_corrected'] = df['delivery_mean_correct'].map(lambda x: 0 if x == 1 else x)
+if __name__ == '__main__':
 
-df.to_csv('clean_survey.csv')
\ No newline at end of file
+    save(clean_many(sys.argv[1:] or [RAW_PATH]), OUT_PATH)
@@ -4,72 +4,204 @@
 import pandas as pd
 import numpy as np
 import os
+import io
+import argparse
+import hashlib
+import pickle
+import json
+import sys
 import unicodedata
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
+from multiprocessing import shared_memory
+from python_calamine import CalamineWorkbook
+import xlsxwriter
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+try:
+    import polars as pl
+except ImportError:  # optional: pyarrow's writer is used instead
+    pl = None
+
+
+# Regex patterns shared by the cleaning and analysis functions, compiled once
+_SPLIT_COMMA = re.compile(r",\s*")
+_WS = re.compile(r"\s+")
+_NING = re.compile(r".*ning.*", re.IGNORECASE)
+_A_TO = re.compile(r"\ba\b")
+_TRANSP_MODE = re.compile("|".join(map(re.escape, ['camión', 'motocicleta', 'bicicleta', 'carreta', 'particular'])))
+_UNLOADING = re.compile("|".join(map(re.escape, ['sobre la vía', 'sobre el andén', 'bahía', 'internamente',
+                                                 'vías aledañas', 'parqueadero'])))
+
+# Establishment types, in the priority used to tag an economic activity
+EST_TYPES = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
+EST_TYPE_RENAME = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer',
+                   'Ventas por internet': 'E-commerce'}
+
+# Low-cardinality answers stored as categoricals after cleaning
+CATEGORY_COLUMNS = ['economic_activity', 'supply_day', 'supply_schedule', 'warehouse', 'zuap_warehouse',
+                    'warehouse_equipement', 'supply_unloading', 'online_trans_mode', 'delivery_transp_mode',
+                    'supply_week', 'supply_safety_percep', 'supply_bic_safety_perception']
+
+# Translations of the answers used by the analysis datasets
+DAY_RENAME = {'Domingo': 'Sunday', 'Jueves': 'Thursday', 'Lunes': 'Monday', 'Martes': 'Tuesday',
+              'Miércoles': 'Wednesday', 'Sábado': 'Saturday', 'Viernes': 'Friday'}
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+TRANSP_RENAME = {'bicicleta': 'Bicycle', 'camión': 'Truck', 'carreta': 'Handcart', 'motocicleta': 'Motorcycle',
+                 'particular': 'Private Vehicle'}
+
+UNLOADING_RENAME = {'sobre la vía': 'On the road', 'sobre el andén': 'On the sidewalk', 'bahía': 'Loading/unloading zone',
+                    'internamente': 'Establishment facilities', 'vías aledañas': 'Nearby roads', 'parqueadero': 'Parking lot'}
+
+EQUIPMENT_TO_UNIFY = {'Caminata': 'Manual workforce', 'Na': 'No', '1': 'No', 'Camina': 'Manual workforce',
+                      'Parqueadero de uso interno': 'No', 'Al hombro': 'Manual workforce', 'Descargue a mano': 'Manual workforce',
+                      'no posee': 'No', 'Personal externo': 'Manual workforce', 'Parqueadero para clientes': 'No',
+                      'A mano': 'Manual workforce', 'La misma persona la carga en sus manos': 'Manual workforce',
+                      'No hay bodega': 'No', 'Las personas lo llevan cargados': 'Manual workforce',
+                      'No se requiere por el volumen': 'No', 'No aplica': 'No', 'No es necesario entra oaquete manual': 'No',
+                      'No se requiere lis paquetes vson pequeños sebtraen a mano': 'No', 'Caminando': 'Manual workforce',
+                      'Cajas': 'No', 'Carretilla entra': 'Carretilla', 'Bahía': 'No', np.nan: 'No', 'no': 'No',
+                      'Escaleras eléctricas': 'Other', 'Escalas': 'Other', 'Porta doble': 'Other', 'Montacargas': 'Loading Ramp',
+                      'Rampa mecánica': 'Loading Ramp', 'Gato hidráulico': 'Loading Ramp'}
+EQUIPMENT_RENAME = {'Carretilla': 'Handcart', 'No': 'None', 'Elevador': 'Elevator', 'Rampa fija': 'Fixed Loading Ramp'}
+
+SUPPLY_WEEK_TO_UNIFY = {'La periodicidad es quincenal': 'Other', 'La periodicidad es mensual': 'Other'}
+SUPPLY_WEEK_RENAME = {5: '5 times a week', '6 o más': '6 times or more a week', '1 vez por semana': '1 time a week',
+                      2: '2 times a week', 3: '3 times a week', 4: '4 times a week'}
+SUPPLY_WEEK_ORDER = ['1 time a week', '2 times a week', '3 times a week',
+                     '4 times a week', '5 times a week', '6 times or more a week', 'Other']
+
+WAREHOUSE_RENAME = {'Externo, alquilado': 'External (Rented)',
+                    'Externo, compartido con otros comercios': 'External (Shared)',
+                    'Externo, propio': 'External (Own)',
+                    'Interno': 'Internal',
+                    'No': 'None'}
+
+ZUAP_RENAME = {'Sí': 'Yes'}
+ZUAP_ORDER = ['Yes', 'No']
+
+ONLINE_TO_UNIFY = {'Motocicleta': 'Motorcycle', 'No se realizan ventas por internet': 'No deliveries',
+                   'Vehículo particular': 'Van/Car', 'Furgón': 'Small truck', 'Carreta "zorrilla"': 'Handcart',
+                   'Si se realizan ventas por internet': 'No deliveries', 'Caminata': 'Walking',
+                   'Mostrador': 'No deliveries', np.nan: 'No deliveries', 'No': 'No deliveries',
+                   'Cliente recoje en negocio': 'No deliveries', 'No se realiza': 'No deliveries',
+                   'Bicicleta normal': 'Bike/Cargo Bike', 'Transportadora': 'Carrier', 'Empresa transportadora': 'Carrier',
+                   'Transportadoras': 'Carrier', 'Realizan venta por Internet': 'No deliveries',
+                   'cliente recoge': 'No deliveries', 'Servicio de mensajería': 'Carrier', 'Camioneta': 'Van/Car',
+                   'Bicicleta de carga': 'Bike/Cargo Bike', 'Servicios de mensajería': 'Carrier',
+                   'Novse hace envíos': 'No deliveries', 'Na': 'No deliveries', 'Trnasportadora': 'Carrier',
+                   'Rappifavor': 'Carrier', 'Mensajería contratada': 'Carrier', 'Van': 'Van/Car'}
+
+DELIVERY_TO_UNIFY = {'Motocicleta': 'Motorcycle', 'No se realizan domicilios': 'No deliveries', 'Furgón': 'Van/Car',
+                     'Carreta "zorrilla"': 'Handcart', 'Caminata': 'Walking', 'Vehículo particular': 'Van/Car',
+                     np.nan: 'No deliveries', 'Van': 'Van/Car', 'Carro particular': 'Van/Car', 'Transportadora': 'Carrier',
+                     'Empresa transportadora': 'Carrier', 'Servicio de mensajería': 'Carrier',
+                     'Servicios de mensajería': 'Carrier', 'Camioneta': 'Van/Car', 'Bicicleta normal': 'Bike/Cargo Bike',
+                     'Bicicleta de carga': 'Bike/Cargo Bike', 'No aplica': 'No deliveries',
+                     'No se hacen envíos': 'No deliveries', 'Na': 'No deliveries', 'No': 'No deliveries',
+                     'Trasnportadora': 'Carrier', 'Transportadoras': 'Carrier', 'Mensajeria contratada': 'Carrier',
+                     'Motocarga gasolina': 'Threewheeler'}
+
+# Translation table that deletes every combining mark (accents after NFKD), built
+# with map/filter so the scan over all code points runs without Python bytecode
+_STRIP_MARKS = str.maketrans(dict.fromkeys(filter(unicodedata.combining, map(chr, range(sys.maxunicode + 1)))))
 
 
 def _normalize_text(s):
-    """Lower-case, strip accents, collapse whitespace. Blank on NaN."""
-    if pd.isna(s):
-        return ""
-    s = str(s)
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(c for c in s if not unicodedata.combining(c))  # strip accents
-    s = s.lower().strip()
-    s = re.sub(r"\s+", " ", s)
+    """Lower-case, strip accents, collapse whitespace on a whole Series. Blank on NaN."""
+    s = s.where(s.isna(), s.astype(str))
+    s = s.str.normalize("NFKD").str.translate(_STRIP_MARKS)  # strip accents
+    s = s.str.lower().str.replace(_WS, " ", regex=True).str.strip()
+    return s.fillna("")
+
+
+def _derive_est_type(economic_activity):
+    """Tag each economic activity with the first establishment type it mentions."""
+    low = economic_activity.str.lower()
+    masks = [low.str.contains(word.lower(), regex=False, na=False) for word in EST_TYPES]
+    est_type = np.select(masks, EST_TYPES, default=None)
+    return pd.Categorical(est_type, categories=sorted(EST_TYPES))
+
+
+def _find_keywords(s, pattern):
+    """
+    Lower-case matches of `pattern` in every answer of `s`, one row per distinct
+    keyword found (answers without any keyword are kept as a single NaN row).
+    """
+    found = s.str.lower().str.findall(pattern).explode()
+    return found[~found.reset_index().duplicated().to_numpy()]
+
+
+def _norm_mode(s):
+    """Split comma-separated answers, with any "ning..." answer (ninguno/ninguna) read as 'No'."""
+    return s.str.strip().str.replace(_NING, 'No', regex=True).str.split(_SPLIT_COMMA)
+
+
+def _unify_answers(s, mapping):
+    """
+    Map answers through `mapping` once per distinct answer instead of once per row.
+    Answers missing from `mapping` stay verbatim; missing values take `mapping[np.nan]`.
+    """
+    # map keeps the category dtype when the observed answers map one-to-one, which would reject the fill
+    s = s.astype("category").map(lambda x: mapping.get(x, x), na_action="ignore").astype(object)
+    if np.nan in mapping:
+        s = s.fillna(mapping[np.nan])
     return s
 
 
-def dataframe_cleaning(path):
+def _read_survey(path, usecols):
+    """
+    Read the raw survey workbook with the calamine engine, caching a binary copy
+    next to it so later runs skip the Excel parse. The cache is rebuilt whenever
+    it is older than the workbook. Only the columns accepted by `usecols` are
+    parsed, and the same filter is applied to a cache written with other columns.
+    """
+    cache = str(path) + ".pkl"
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        df = pd.read_pickle(cache)
+        return df[[c for c in df.columns if usecols(c)]]
+
+    df = pd.read_excel(path, engine="calamine", usecols=usecols)
+    df.to_pickle(cache)
+    return df
+
+
+def _read_survey_chunked(path, usecols, chunksize):
+    """
+    Stream the first sheet of the workbook `chunksize` rows at a time, keeping
+    only the columns accepted by `usecols`, so the full-width sheet is never
+    held in memory at once. Empty cells are read as missing values.
+    """
+    rows = CalamineWorkbook.from_path(str(path)).get_sheet_by_index(0).iter_rows()
+    header = next(rows)
+    keep = [i for i, c in enumerate(header) if usecols(c)]
+    columns = [header[i] for i in keep]
+
+    chunks = []
+    while batch := list(islice(rows, chunksize)):
+        chunks.append(pd.DataFrame([[row[i] for i in keep] for row in batch], columns=columns).replace("", np.nan))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+
+def dataframe_cleaning(path, chunksize=None):
     """
     Clean the survey dataframe by removing non-informative columns and renaming columns
     to more descriptive English names for R analysis.
     
     Parameters:
     path (str): Path to the Excel file containing the survey data
+    chunksize (int, optional): Stream the workbook this many rows at a time instead of
+        loading it whole (for large surveys; the cache is not used)
     
     Returns:
     pd.DataFrame: Cleaned dataframe ready for analysis
     """
     
-    df = pd.read_excel(path)
-
-    # Non informative columns that won't be considered in the analysis  
-    col_out = ['id', 'db', 'Marca temporal', 'Correo electrónico', 'Teléfono de contacto',
-               'Ir al fin de la encuesta.', 'Nombre de la empresa', 
-               'De acuerdo con el tipo de carga que distribuye su empresa, indique máximo 3 tipos en el siguiente listado:',
-               '¿El origen de la mercancía que transporta es el Valle de Aburrá?',
-               'Por favor, indique el municipio:',
-               'Por favor, indique cuántas entregas hace en el centro de Medellín al día:',
-               'Por favor, indique el número de establecimientos que surte en el centro de Medellín a diario:',
-               '¿Cuántos pedidos recibe su empresa diariamente que tienen como destino el centro de Medellín?',
-               'Por favor indique la cantidad de vehículos con combustión a diésel (ACPM) con los que cuenta su empresa:',
-               'Por favor indique la cantidad de vehículos con combustión a gasolina con los que cuenta su empresa:',
-               'Por favor indique la cantidad de vehículos con combustión a gas natural vehicular (GNV) con los que cuenta su empresa:',
-               'Por favor indique la cantidad de vehículos con motor eléctrico con los que cuenta su empresa:',
-               'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos anteriores a 1990]',
-               'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos entre 1991 y 2000]',
-               'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos entre 2001 y 2010]',
-               'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos entre 2011 y 2015]',
-               'Por favor, indique el rango de edad promedio del parque vehicular de su empresa [Modelos del 2016 en adelante]',
-               '¿Cuánto es el rendimiento en galones/kilómetro, de sus vehículos a ACPM?',
-               '¿Cuánto es el rendimiento en galones/kilómetro, de sus vehículos a gasolina?',
-               '¿Cuánto es el rendimiento en metros cúbicos/kilómetro, de sus vehículos a GNV?',
-               '¿Cuánto es el rendimiento kilowatt-hora, de sus vehículos eléctricos?',
-               '¿Cuánto es el costo total por movilizar un camión cargado hacia el centro de Medellín?',
-               '¿Cuántas horas al volante permanece durante un turno de reparto una/un conductora/or en su empresa?',
-               'De acuerdo con la siguiente escala, donde 1 es "Muy compleja" y 5 es "Muy adecuada" ¿Cómo considera la relación de sus conductores con los demás actores viales (peatones, ciclistas, conductores, transporte público) en el espacio público de la ZUAP?',
-               '¿Al interior de su empresa se realizan actividades que promuevan la actividad física entre sus calaboradoras/es?',
-               '¿Qué actividades se realizan?',
-               '¿Cuántas veces por semana se realizan actividades para promover la actividad física?',
-               '¿Conoce usted el Decreto No 1790 de noviembre 20 de 2012 (Decreto de Zona Amarilla o de cargue y descargue en el centro de la ciudad)?']
-
-    df = df.drop(col_out, axis=1)
-
-    # Lowercase column names
-    df.columns = df.columns.str.lower()
-
-    # Change variables names for facility
+    # Change variables names for facility (matched on the lowercased header)
     col_name = {'dirección de la empresa': 'est_address',
                 'por favor indique el número de colaboradores que tiene su empresa o comercio': 'employees',
                 'por favor indique el número de mujeres que trabajan en su empresa o comercio': 'female_employees',
@@ -102,11 +234,31 @@ def dataframe_cleaning(path):
                 '% mujeres en la distribución': 'women_distri_percentage',
                 '% mujeres vinculadas': 'hired_women_percentage'}
 
-    df = df.rename(columns=col_name)
+    # Informative columns: every renamed column plus the ones kept under their own name
+    keep = set(col_name) | {'¿en su empresa o comercio cuentan con colaboradoras mujeres?', 'porcentaje mujeres'}
+
+    # Read only those columns instead of parsing and then dropping the rest
+    if chunksize:
+        df = _read_survey_chunked(path, usecols=lambda c: c.lower() in keep, chunksize=chunksize)
+    else:
+        df = _read_survey(path, usecols=lambda c: c.lower() in keep)
+
+    df = df.rename(columns=lambda c: col_name.get(c.lower(), c.lower()))
 
     # Normalize main_products column
     if "main_products" in df.columns:
-        df["main_products"] = df["main_products"].map(_normalize_text).astype("category")
+        df["main_products"] = _normalize_text(df["main_products"]).astype("category")
+
+    # Employee counts are small integers
+    df['employees'] = df['employees'].astype("Int32")
+
+    # Store repeated answers as categories
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+
+    # Identify type of commerce once for every analysis
+    df['est_type'] = _derive_est_type(df['economic_activity'])
 
     return df
 
@@ -116,184 +268,94 @@ def temporal_analysis(df):
     Function to compute temporal analysis of supply schedules.
     Returns a dataframe ready for heatmap visualization in R.
     """
-    # Keep relevant columns
-    df = df[['supply_day', 'supply_schedule', 'employees']].copy()
-
-    # Replace 'a' for 'to'
-    df['supply_schedule'] = df['supply_schedule'].str.replace('a', 'to')
-
-    # Explode supply days
-    df['supply_day'] = df['supply_day'].str.split(',\s*')
+    # Replace the word 'a' for 'to' ("08:00 a 09:00") and explode supply days
+    df = df[['supply_day', 'supply_schedule']].assign(
+        supply_day=df['supply_day'].str.split(_SPLIT_COMMA),
+        supply_schedule=df['supply_schedule'].str.replace(_A_TO, 'to', regex=True).str.split(_SPLIT_COMMA))
     df = df.explode('supply_day')
 
     # Explode supply schedule
-    df['supply_schedule'] = df['supply_schedule'].str.split(',\s*')
     df = df.explode('supply_schedule').reset_index(drop=True)
 
-    # Groupby to compute heatmap
-    df = df.groupby(['supply_day', 'supply_schedule']).count().rename(columns={'employees': 'frequency'}).reset_index()
+    # Count to compute heatmap
     df = df[df['supply_day'] != 'Festivos']
-    df = df.pivot(index='supply_schedule', columns='supply_day', values='frequency').fillna(0)
-
-    rename = {'Domingo': 'Sunday', 'Jueves': 'Thursday', 'Lunes': 'Monday', 'Martes': 'Tuesday',
-              'Miércoles': 'Wednesday', 'Sábado': 'Saturday', 'Viernes': 'Friday'}
-    df.rename(columns=rename, inplace=True)
+    df = df.groupby(['supply_schedule', 'supply_day'], sort=False).size().unstack(fill_value=0).sort_index()
+    df.rename(columns=DAY_RENAME, inplace=True)
 
     # Reorder columns
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    available_days = [day for day in day_order if day in df.columns]
+    available_days = [day for day in DAY_ORDER if day in df.columns]
     df = df[available_days]
 
     return df
 
 
-def transportation_mode(df):
+def _pivot_share(df, col, mapping=None):
     """
-    Type of Establishment vs Delivery Transportation Mode analysis.
+    Shared kernel of the establishment-type analyses.
+    Counts observed answers of `col` per establishment type, pivots them to columns,
+    normalizes every row to proportions and translates the establishment types.
+    `mapping` optionally translates the answer columns.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_unloading', 'employees']].copy()
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Identify type of transportation mode
-    transp_mode = ['camión', 'motocicleta', 'bicicleta', 'carreta', 'particular']
-    df['transp_type'] = df['supply_unloading'].apply(lambda x: [word for word in transp_mode if word.lower() in x.lower()])
-
-    # Explode transportation mode
-    df = df.explode('transp_type').reset_index(drop=True)
+    df = df.groupby(['est_type', col], observed=True, sort=False).size().unstack(fill_value=0)
+    # supply_week mixes numbers and text, so answers are ordered by their text
+    df = df.sort_index().sort_index(axis=1, key=lambda answers: answers.astype(str))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'transp_type']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='transp_type', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Row shares on the raw array, without index alignment
+    shares = df.to_numpy(dtype=float)
+    shares /= shares.sum(axis=1, keepdims=True)
+    df = pd.DataFrame(shares, index=df.index, columns=df.columns)
 
     # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
-
-    rename1 = {'bicicleta': 'Bicycle', 'camión': 'Truck', 'carreta': 'Handcart', 'motocicleta': 'Motorcycle', 'particular': 'Private Vehicle'}
-    df.rename(columns=rename1, inplace=True)
+    df.rename(index=EST_TYPE_RENAME, inplace=True)
+    if mapping:
+        df.rename(columns=mapping, inplace=True)
 
     return df
 
 
-def unloading_location(df):
+def transportation_mode(df):
     """
-    Type of Establishment vs Unloading Location analysis.
+    Type of Establishment vs Delivery Transportation Mode analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_unloading', 'employees']].copy()
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Identify how is the unloading
-    unloading = ['sobre la vía', 'sobre el andén', 'bahía', 'internamente', 'vías aledañas', 'parqueadero']
-    df['unloading_location'] = df['supply_unloading'].apply(lambda x: [word for word in unloading if word.lower() in x.lower()])
-
-    # Explode unloading location
-    df = df.explode('unloading_location').reset_index(drop=True)
+    # Identify and explode type of transportation mode
+    df = df[['est_type']].join(_find_keywords(df['supply_unloading'], _TRANSP_MODE).rename('transp_type'))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'unloading_location']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='unloading_location', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    return _pivot_share(df, 'transp_type', TRANSP_RENAME)
 
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
 
-    rename1 = {'sobre la vía': 'On the road', 'sobre el andén': 'On the sidewalk', 'bahía': 'Loading/unloading zone',
-               'internamente': 'Establishment facilities', 'vías aledañas': 'Nearby roads', 'parqueadero': 'Parking lot'}
-    df.rename(columns=rename1, inplace=True)
+def unloading_location(df):
+    """
+    Type of Establishment vs Unloading Location analysis.
+    """
+    # Identify and explode how is the unloading
+    df = df[['est_type']].join(_find_keywords(df['supply_unloading'], _UNLOADING).rename('unloading_location'))
 
-    return df
+    return _pivot_share(df, 'unloading_location', UNLOADING_RENAME)
 
 
 def unloading_equipement(df):
     """
     Type of Establishment vs Unloading Equipment analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'warehouse_equipement', 'employees']].copy()
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Identify unloading equipement
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.strip()
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.replace(r".*ning.*", 'No', regex=True, case=False)
-
-    # Explode warehouse equipement
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.split(',\s*')
+    # Identify and explode warehouse equipement
+    df = df[['est_type']].assign(warehouse_equipement=_norm_mode(df['warehouse_equipement']))
     df = df.explode('warehouse_equipement')
 
     # Unify type of equipement
-    to_unify = {'Caminata': 'Manual workforce', 'Na': 'No', '1': 'No', 'Camina': 'Manual workforce',
-                'Parqueadero de uso interno': 'No', 'Al hombro': 'Manual workforce', 'Descargue a mano': 'Manual workforce',
-                'no posee': 'No', 'Personal externo': 'Manual workforce', 'Parqueadero para clientes': 'No',
-                'A mano': 'Manual workforce', 'La misma persona la carga en sus manos': 'Manual workforce',
-                'No hay bodega': 'No', 'Las personas lo llevan cargados': 'Manual workforce',
-                'No se requiere por el volumen': 'No', 'No aplica': 'No', 'No es necesario entra oaquete manual': 'No',
-                'No se requiere lis paquetes vson pequeños sebtraen a mano': 'No', 'Caminando': 'Manual workforce',
-                'Cajas': 'No', 'Carretilla entra': 'Carretilla', 'Bahía': 'No', np.nan: 'No', 'no': 'No',
-                'Escaleras eléctricas': 'Other', 'Escalas': 'Other', 'Porta doble': 'Other', 'Montacargas': 'Loading Ramp',
-                'Rampa mecánica': 'Loading Ramp', 'Gato hidráulico': 'Loading Ramp'}
-
-    df['warehouse_equipement'] = df['warehouse_equipement'].replace(to_unify)
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'warehouse_equipement']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='warehouse_equipement', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    df['warehouse_equipement'] = _unify_answers(df['warehouse_equipement'], EQUIPMENT_TO_UNIFY)
 
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
-
-    rename1 = {'Carretilla': 'Handcart', 'No': 'None', 'Elevador': 'Elevator',
-                 'Rampa fija': 'Fixed Loading Ramp'}
-    df.rename(columns=rename1, inplace=True)
-
-    return df
+    return _pivot_share(df, 'warehouse_equipement', EQUIPMENT_RENAME)
 
 
 def supply_frequency(df):
     """
     Type of Establishment vs Supply frequency analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_week', 'employees']].copy()
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
     # Change names
-    to_unify = {'La periodicidad es quincenal': 'Other', 'La periodicidad es mensual': 'Other'}
-    df['supply_week'] = df['supply_week'].replace(to_unify)
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_week']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_week', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
-
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
-
-    rename1 = {5: '5 times a week', '6 o más': '6 times or more a week', '1 vez por semana': '1 time a week',
-               2: '2 times a week', 3: '3 times a week', 4: '4 times a week'}
-    df.rename(columns=rename1, inplace=True)
+    df = df[['est_type']].assign(supply_week=df['supply_week'].map(lambda x: SUPPLY_WEEK_TO_UNIFY.get(x, x)))
+    df = _pivot_share(df, 'supply_week', SUPPLY_WEEK_RENAME)
 
-    column_order = ['1 time a week', '2 times a week', '3 times a week',
-                   '4 times a week', '5 times a week', '6 times or more a week', 'Other']
-    available_columns = [col for col in column_order if col in df.columns]
+    available_columns = [col for col in SUPPLY_WEEK_ORDER if col in df.columns]
     df = df[available_columns]
 
     return df
@@ -303,57 +365,16 @@ def warehouse_ownership(df):
     """
     Warehouse ownership analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'warehouse', 'employees']].copy()
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'warehouse']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='warehouse', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
-
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
-
-    rename1 = {'Externo, alquilado': 'External (Rented)',
-               'Externo, compartido con otros comercios': 'External (Shared)',
-               'Externo, propio': 'External (Own)',
-               'Interno': 'Internal',
-               'No': 'None'}
-    df.rename(columns=rename1, inplace=True)
-
-    return df
+    return _pivot_share(df, 'warehouse', WAREHOUSE_RENAME)
 
 
 def warehouse_in_zuap(df):
     """
     Warehouse location in ZUAP analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'zuap_warehouse', 'employees']].copy()
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'zuap_warehouse']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='zuap_warehouse', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
-
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
+    df = _pivot_share(df, 'zuap_warehouse', ZUAP_RENAME)
 
-    rename1 = {'Sí': 'Yes'}
-    df.rename(columns=rename1, inplace=True)
-
-    column_order = ['Yes', 'No']
-    available_columns = [col for col in column_order if col in df.columns]
+    available_columns = [col for col in ZUAP_ORDER if col in df.columns]
     df = df[available_columns]
 
     return df
@@ -363,140 +384,154 @@ def e_commerce_deliveries(df):
     """
     E-commerce deliveries analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'online_trans_mode', 'employees']].copy()
+    # Identify and explode delivery modes
+    df = df[['est_type']].assign(online_trans_mode=_norm_mode(df['online_trans_mode']))
+    df = df.explode('online_trans_mode')
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    df['online_trans_mode'] = _unify_answers(df['online_trans_mode'], ONLINE_TO_UNIFY)
 
-    # Identify unloading equipement
-    df['online_trans_mode'] = df['online_trans_mode'].str.strip()
-    df['online_trans_mode'] = df['online_trans_mode'].str.replace(r".*ning.*", 'No', regex=True, case=False)
+    return _pivot_share(df, 'online_trans_mode')
 
-    # Explode warehouse equipement
-    df['online_trans_mode'] = df['online_trans_mode'].str.split(',\s*')
-    df = df.explode('online_trans_mode')
 
-    to_unify = {'Motocicleta': 'Motorcycle', 'No se realizan ventas por internet': 'No deliveries',
-                'Vehículo particular': 'Van/Car', 'Furgón': 'Small truck', 'Carreta "zorrilla"': 'Handcart',
-               'Si se realizan ventas por internet': 'No deliveries', 'Caminata': 'Walking',
-               'Mostrador': 'No deliveries', np.nan: 'No deliveries', 'No': 'No deliveries',
-               'Cliente recoje en negocio': 'No deliveries', 'No se realiza': 'No deliveries',
-               'Bicicleta normal': 'Bike/Cargo Bike', 'Transportadora': 'Carrier', 'Empresa transportadora': 'Carrier',
-               'Transportadoras': 'Carrier', 'Realizan venta por Internet': 'No deliveries',
-               'cliente recoge': 'No deliveries', 'Servicio de mensajería': 'Carrier', 'Camioneta': 'Van/Car',
-               'Bicicleta de carga': 'Bike/Cargo Bike', 'Servicios de mensajería': 'Carrier',
-               'Novse hace envíos': 'No deliveries', 'Na': 'No deliveries', 'Trnasportadora': 'Carrier',
-               'Rappifavor': 'Carrier', 'Mensajería contratada': 'Carrier', 'Van': 'Van/Car'}
-
-    df['online_trans_mode'] = df['online_trans_mode'].replace(to_unify)
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'online_trans_mode']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='online_trans_mode', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+def traditional_deliveries(df):
+    """
+    Traditional deliveries analysis.
+    """
+    # Identify and explode delivery modes
+    df = df[['est_type']].assign(delivery_transp_mode=_norm_mode(df['delivery_transp_mode']))
+    df = df.explode('delivery_transp_mode')
+
+    df['delivery_transp_mode'] = _unify_answers(df['delivery_transp_mode'], DELIVERY_TO_UNIFY)
 
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
+    return _pivot_share(df, 'delivery_transp_mode')
 
-    return df
 
+def supply_perception(df):
+    """
+    Supply safety perception analysis.
+    """
+    return _pivot_share(df, 'supply_safety_percep')
 
-def traditional_deliveries(df):
+
+def bike_perception(df):
     """
-    Traditional deliveries analysis.
+    Bike safety perception analysis.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'delivery_transp_mode', 'employees']].copy()
+    return _pivot_share(df, 'supply_bic_safety_perception')
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
 
-    # Identify unloading equipement
-    df['delivery_transp_mode'] = df['delivery_transp_mode'].str.strip()
-    df['delivery_transp_mode'] = df['delivery_transp_mode'].str.replace(r".*ning.*", 'No', regex=True, case=False)
+# Processed datasets exported for R: name -> (label used in messages, builder)
+ANALYSES = {'temporal_analysis': ('temporal analysis', temporal_analysis),
+            'transportation_mode': ('transportation mode', transportation_mode),
+            'unloading_location': ('unloading location', unloading_location),
+            'unloading_equipment': ('unloading equipment', unloading_equipement),
+            'supply_frequency': ('supply frequency', supply_frequency),
+            'warehouse_ownership': ('warehouse ownership', warehouse_ownership),
+            'warehouse_in_zuap': ('warehouse ZUAP location', warehouse_in_zuap),
+            'ecommerce_deliveries': ('e-commerce deliveries', e_commerce_deliveries),
+            'traditional_deliveries': ('traditional deliveries', traditional_deliveries),
+            'supply_perception': ('supply perception', supply_perception),
+            'bike_perception': ('bike perception', bike_perception)}
 
-    # Explode warehouse equipement
-    df['delivery_transp_mode'] = df['delivery_transp_mode'].str.split(',\s*')
-    df = df.explode('delivery_transp_mode')
 
-    to_unify = {'Motocicleta': 'Motorcycle', 'No se realizan domicilios': 'No deliveries', 'Furgón': 'Van/Car',
-               'Carreta "zorrilla"': 'Handcart', 'Caminata': 'Walking', 'Vehículo particular': 'Van/Car', np.nan: 'No deliveries',
-               'Van': 'Van/Car', 'Carro particular': 'Van/Car', 'Transportadora': 'Carrier',
-               'Empresa transportadora': 'Carrier', 'Servicio de mensajería': 'Carrier', 'Servicios de mensajería': 'Carrier',
-               'Camioneta': 'Van/Car', 'Bicicleta normal': 'Bike/Cargo Bike', 'Bicicleta de carga': 'Bike/Cargo Bike',
-               'No aplica': 'No deliveries', 'No se hacen envíos': 'No deliveries', 'Na': 'No deliveries', 'No': 'No deliveries',
-               'Trasnportadora': 'Carrier', 'Transportadoras': 'Carrier', 'Mensajeria contratada': 'Carrier',
-                'Motocarga gasolina': 'Threewheeler'}
+# Processed datasets with fewer rows are left out of the Excel workbook (they are
+# still written as individual files)
+MIN_XLSX_ROWS = 2
 
-    df['delivery_transp_mode'] = df['delivery_transp_mode'].replace(to_unify)
+# Cleaned frame shared by the builder processes, set once per worker
+_DF = None
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'delivery_transp_mode']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='delivery_transp_mode', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
 
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
+def _set_df(shm_name, size):
+    global _DF
+    shm = shared_memory.SharedMemory(name=shm_name)
+    with shm.buf[:size] as payload:
+        _DF = pickle.loads(payload)
+    shm.close()
 
-    return df
 
+def _run_builder(builder):
+    return builder(_DF)
 
-def supply_perception(df):
+
+def _cache_key(df):
     """
-    Supply safety perception analysis.
+    Content hash of the cleaned frame and of this script, so cached datasets are
+    reused only for the same data and the same builders.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_safety_percep', 'employees']].copy()
+    h = hashlib.blake2b(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes(), digest_size=16)
+    with open(__file__, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_safety_percep']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_safety_percep', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+def _categorize_text(df):
+    """
+    Store text columns whose distinct values cover less than half of the rows as
+    categories, so the exports write each repeated answer once.
+    """
+    for c in df.select_dtypes("object"):
+        if df[c].nunique(dropna=False) < 0.5 * len(df):
+            df[c] = df[c].astype("category")
+    return df
 
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
 
+def _downcast_numeric(df):
+    """
+    Downcast integer and float columns to the smallest type that holds every
+    value exactly. Columns that would lose precision keep their type.
+    """
+    for kind in ("integer", "float"):
+        for c in df.select_dtypes(kind):
+            cast = pd.to_numeric(df[c], downcast=kind)
+            if cast.dtype != df[c].dtype and cast.astype(df[c].dtype).equals(df[c]):
+                df[c] = cast
     return df
 
 
-def bike_perception(df):
+def _arrow_table(df):
     """
-    Bike safety perception analysis.
+    Convert a cleaned dataframe to an Arrow table. Columns mixing numbers and text
+    (e.g. supply_week: 2, 3, '6 o más') are written as text.
     """
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_bic_safety_perception', 'employees']].copy()
+    for c in df.columns:
+        values = df[c].cat.categories if isinstance(df[c].dtype, pd.CategoricalDtype) else df[c]
+        if pd.api.types.infer_dtype(values, skipna=True).startswith("mixed"):
+            df = df.assign(**{c: df[c].astype("string")})
+    return pa.Table.from_pandas(df, preserve_index=False)
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_bic_safety_perception']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_bic_safety_perception', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+def _append_sheet(workbook, name, df, index=False):
+    """
+    Append `df` as a new sheet of an xlsxwriter workbook, one row at a time and
+    without styles. Missing values are left as empty cells. Rows are written
+    strictly in order, as the workbook's constant_memory mode flushes each row
+    to disk (and makes it immutable) as soon as the next one starts.
+    """
+    if index:
+        df = df.reset_index()
+    sheet = workbook.add_worksheet(name)
+    sheet.write_row(0, 0, [str(c) for c in df.columns])
 
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
+    # Convert each column to native Python values once, then write row batches
+    columns = [df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns]
+    for r, row in enumerate(zip(*columns), 1):
+        sheet.write_row(r, 0, row)
 
-    return df
 
+def _write_csv(table, path):
+    """Write an Arrow table as CSV through a 1 MiB output buffer."""
+    with pa.output_stream(path, buffer_size=1 << 20) as sink:
+        pacsv.write_csv(table, sink)
 
-def create_cleaned_df_for_r():
+
+def create_cleaned_df_for_r(fmt="csv", emit_excel=False):
     """
     Create and export a cleaned dataframe for R analysis.
     This function loads the raw survey data, cleans it, and exports it as CSV and Excel files.
-    Also creates processed dataframes for specific analyses.
+    Also creates processed dataframes for specific analyses, written as CSV or,
+    with fmt="parquet", as zstd Parquet files (arrow::read_parquet in R).
+    The multi-sheet Excel workbook is only written when `emit_excel` is True.
     """
     
     # Define the path to the raw data
@@ -512,143 +547,158 @@ def create_cleaned_df_for_r():
         print("Loading and cleaning survey data...")
         
         # Load and clean the data
-        df_cleaned = dataframe_cleaning(raw_data_path)
+        df_cleaned = _downcast_numeric(_categorize_text(dataframe_cleaning(raw_data_path)))
+        
+        # Schema of the cleaned data, reused by the prints and the schema file
+        shape = df_cleaned.shape
+        dtypes = df_cleaned.dtypes
+        columns = df_cleaned.columns.tolist()
         
         print(f"Data cleaned successfully!")
-        print(f"Cleaned columns: {df_cleaned.shape[1]}")
-        print(f"Number of observations: {df_cleaned.shape[0]}")
+        print(f"Cleaned columns: {shape[1]}")
+        print(f"Number of observations: {shape[0]}")
         
         # Export main cleaned dataset
         csv_output_path = os.path.join(output_dir, "cleaned_survey_for_r.csv")
-        excel_output_path = os.path.join(output_dir, "cleaned_survey_for_r.xlsx")
+        parquet_output_path = os.path.join(output_dir, "cleaned_survey_for_r.parquet")
+        table = _arrow_table(df_cleaned)
         
         print(f"Exporting main dataset to CSV: {csv_output_path}")
-        df_cleaned.to_csv(csv_output_path, index=False, encoding='utf-8')
+        if pl is not None:
+            pl.from_arrow(table).write_csv(csv_output_path)
+        else:
+            _write_csv(table, csv_output_path)
+        
+        print(f"Exporting main dataset to Parquet: {parquet_output_path}")
+        pq.write_table(table, parquet_output_path, compression="zstd")
         
-        print(f"Exporting main dataset to Excel: {excel_output_path}")
-        df_cleaned.to_excel(excel_output_path, index=False)
+        # Column types for readers that want to declare them up front (read_csv(col_types=...))
+        with open(os.path.join(output_dir, "cleaned_survey_for_r_schema.json"), "w", encoding="utf-8") as f:
+            json.dump({'columns': columns, 'dtypes': {c: str(t) for c, t in dtypes.items()}, 'shape': shape},
+                      f, ensure_ascii=False, indent=2)
         
         # Create processed dataframes for analysis
         print("\nCreating processed dataframes for specific analyses...")
         
         processed_datasets = {}
-        
-        try:
-            print("- Creating temporal analysis dataset...")
-            processed_datasets['temporal_analysis'] = temporal_analysis(df_cleaned)
-        except Exception as e:
-            print(f"  Error in temporal analysis: {str(e)}")
-        
-        try:
-            print("- Creating transportation mode dataset...")
-            processed_datasets['transportation_mode'] = transportation_mode(df_cleaned)
-        except Exception as e:
-            print(f"  Error in transportation mode: {str(e)}")
-        
-        try:
-            print("- Creating unloading location dataset...")
-            processed_datasets['unloading_location'] = unloading_location(df_cleaned)
-        except Exception as e:
-            print(f"  Error in unloading location: {str(e)}")
-        
-        try:
-            print("- Creating unloading equipment dataset...")
-            processed_datasets['unloading_equipment'] = unloading_equipement(df_cleaned)
-        except Exception as e:
-            print(f"  Error in unloading equipment: {str(e)}")
-        
-        try:
-            print("- Creating supply frequency dataset...")
-            processed_datasets['supply_frequency'] = supply_frequency(df_cleaned)
-        except Exception as e:
-            print(f"  Error in supply frequency: {str(e)}")
-        
-        try:
-            print("- Creating warehouse ownership dataset...")
-            processed_datasets['warehouse_ownership'] = warehouse_ownership(df_cleaned)
-        except Exception as e:
-            print(f"  Error in warehouse ownership: {str(e)}")
-        
-        try:
-            print("- Creating warehouse ZUAP location dataset...")
-            processed_datasets['warehouse_in_zuap'] = warehouse_in_zuap(df_cleaned)
-        except Exception as e:
-            print(f"  Error in warehouse ZUAP location: {str(e)}")
-        
-        try:
-            print("- Creating e-commerce deliveries dataset...")
-            processed_datasets['ecommerce_deliveries'] = e_commerce_deliveries(df_cleaned)
-        except Exception as e:
-            print(f"  Error in e-commerce deliveries: {str(e)}")
-        
-        try:
-            print("- Creating traditional deliveries dataset...")
-            processed_datasets['traditional_deliveries'] = traditional_deliveries(df_cleaned)
-        except Exception as e:
-            print(f"  Error in traditional deliveries: {str(e)}")
-        
-        try:
-            print("- Creating supply perception dataset...")
-            processed_datasets['supply_perception'] = supply_perception(df_cleaned)
-        except Exception as e:
-            print(f"  Error in supply perception: {str(e)}")
-        
-        try:
-            print("- Creating bike perception dataset...")
-            processed_datasets['bike_perception'] = bike_perception(df_cleaned)
-        except Exception as e:
-            print(f"  Error in bike perception: {str(e)}")
+
+        # Reuse datasets built earlier from the same cleaned data
+        cache_dir = os.path.join(output_dir, ".cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        key = _cache_key(df_cleaned)
+        cached = {name: os.path.join(cache_dir, f"{key}_{name}.pkl") for name in ANALYSES}
+        to_build = []
+        for name, (label, builder) in ANALYSES.items():
+            if os.path.exists(cached[name]):
+                print(f"- Loading cached {label} dataset...")
+                processed_datasets[name] = pd.read_pickle(cached[name])
+            else:
+                to_build.append(name)
+
+        # Builders only read df_cleaned: send it once to every worker process
+        if to_build:
+            # The analyses count only establishments that reported their employees, as the
+            # original groupby().count() on employees did
+            counted = df_cleaned[df_cleaned['employees'].notna()]
+
+            # Serialize the frame once into shared memory; workers only get its name
+            payload = pickle.dumps(counted, protocol=pickle.HIGHEST_PROTOCOL)
+            shm = shared_memory.SharedMemory(create=True, size=len(payload))
+            shm.buf[:len(payload)] = payload
+            try:
+                with ProcessPoolExecutor(max_workers=min(len(to_build), os.cpu_count() or 1),
+                                         initializer=_set_df, initargs=(shm.name, len(payload))) as executor:
+                    futures = {}
+                    for name in to_build:
+                        label, builder = ANALYSES[name]
+                        print(f"- Creating {label} dataset...")
+                        futures[executor.submit(_run_builder, builder)] = name
+
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        try:
+                            processed_datasets[name] = future.result()
+                            processed_datasets[name].to_pickle(cached[name])
+                        except Exception as e:
+                            # A missing dataset would leave the R notebooks reading stale files
+                            print(f"  Error in {ANALYSES[name][0]}: {str(e)}")
+                            raise
+            finally:
+                shm.close()
+                shm.unlink()
+
+        # Keep the datasets in the order of ANALYSES for the exports
+        processed_datasets = {name: _downcast_numeric(processed_datasets[name])
+                              for name in ANALYSES if name in processed_datasets}
         
         # Export processed datasets
         print("\nExporting processed datasets...")
+        valid = {name: dataset for name, dataset in processed_datasets.items()
+                 if dataset is not None and not dataset.empty}
         
-        # Create a comprehensive Excel file with multiple sheets
-        excel_processed_path = os.path.join(output_dir, "processed_datasets_for_r.xlsx")
-        with pd.ExcelWriter(excel_processed_path, engine='openpyxl') as writer:
-            # Export main cleaned dataset
-            df_cleaned.to_excel(writer, sheet_name='main_cleaned_data', index=False)
-            
-            # Export each processed dataset
-            for name, dataset in processed_datasets.items():
-                if dataset is not None and not dataset.empty:
-                    dataset.to_excel(writer, sheet_name=name, index=True)
-                    print(f"  - Exported {name} dataset")
-        
-        # Also export individual CSV files for each processed dataset
-        for name, dataset in processed_datasets.items():
-            if dataset is not None and not dataset.empty:
-                csv_path = os.path.join(output_dir, f"{name}_for_r.csv")
-                dataset.to_csv(csv_path, index=True, encoding='utf-8')
+        # Also export individual files for each processed dataset, in the
+        # background while the Excel workbook is written
+        if fmt == "parquet":
+            write_dataset = lambda table, path: pq.write_table(table, path, compression="zstd")
+        else:
+            write_dataset = _write_csv
+        with ThreadPoolExecutor(max_workers=min(8, len(valid) or 1)) as executor:
+            csv_jobs = [executor.submit(write_dataset, _arrow_table(dataset.reset_index()),
+                                        os.path.join(output_dir, f"{name}_for_r.{fmt}"))
+                        for name, dataset in valid.items()]
+
+            if emit_excel:
+                # Create a comprehensive Excel file with multiple sheets
+                excel_processed_path = os.path.join(output_dir, "processed_datasets_for_r.xlsx")
+                workbook = xlsxwriter.Workbook(excel_processed_path, {'constant_memory': True,
+                                                                      'strings_to_numbers': False})
+
+                # Export main cleaned dataset
+                _append_sheet(workbook, 'main_cleaned_data', df_cleaned)
+
+                # Export each processed dataset
+                for name, dataset in valid.items():
+                    if len(dataset) >= MIN_XLSX_ROWS:
+                        _append_sheet(workbook, name, dataset, index=True)
+                        print(f"  - Exported {name} dataset")
+                    else:
+                        print(f"  - Skipped {name} sheet ({len(dataset)} row)")
+                workbook.close()
+            else:
+                print("  - Skipped processed_datasets_for_r.xlsx (use --emit-excel to write it)")
+
+            for job in csv_jobs:
+                job.result()
         
-        print("\nData summary:")
-        print(f"Main dataset shape: {df_cleaned.shape}")
-        print("\nColumn names:")
-        for i, col in enumerate(df_cleaned.columns, 1):
-            print(f"{i:2d}. {col}")
+        # Collect the summary and write it to the console in one go
+        buf = io.StringIO()
+        print("\nData summary:", file=buf)
+        print(f"Main dataset shape: {shape}", file=buf)
+        print("\nColumn names:", file=buf)
+        buf.write("\n".join(f"{i:2d}. {col}" for i, col in enumerate(columns, 1)) + "\n")
         
-        print(f"\nFirst few rows of main dataset:")
-        print(df_cleaned.head())
+        print(f"\nFirst few rows of main dataset:", file=buf)
+        print(df_cleaned.head(), file=buf)
         
-        print(f"\nData types:")
-        print(df_cleaned.dtypes)
+        print(f"\nData types:", file=buf)
+        print(dtypes, file=buf)
         
-        print(f"\nMissing values per column:")
-        missing_values = df_cleaned.isnull().sum()
-        missing_percent = (missing_values / len(df_cleaned)) * 100
-        missing_df = pd.DataFrame({
-            'Missing_Count': missing_values,
-            'Missing_Percent': missing_percent
-        })
-        missing_summary = missing_df[missing_df['Missing_Count'] > 0].sort_values('Missing_Count', ascending=False)
+        print(f"\nMissing values per column:", file=buf)
+        counts = df_cleaned.isna().sum().to_numpy()
+        missing = counts > 0
+        missing_summary = pd.DataFrame({
+            'Missing_Count': counts[missing],
+            'Missing_Percent': counts[missing] * (100.0 / shape[0])
+        }, index=df_cleaned.columns[missing]).sort_values('Missing_Count', ascending=False)
         if not missing_summary.empty:
-            print(missing_summary)
+            print(missing_summary, file=buf)
         else:
-            print("No missing values found!")
+            print("No missing values found!", file=buf)
         
-        print(f"\nProcessed datasets summary:")
-        for name, dataset in processed_datasets.items():
-            if dataset is not None and not dataset.empty:
-                print(f"- {name}: {dataset.shape}")
+        print(f"\nProcessed datasets summary:", file=buf)
+        for name, dataset in valid.items():
+            print(f"- {name}: {dataset.shape}", file=buf)
+        sys.stdout.write(buf.getvalue())
         
         return df_cleaned, processed_datasets
         
@@ -661,25 +711,32 @@ def main():
     """
     Main function to execute the data cleaning and export process.
     """
+    parser = argparse.ArgumentParser(description="ZUAP Survey Data Cleaning for R Analysis")
+    parser.add_argument("--format", dest="fmt", choices=["csv", "parquet"], default="csv",
+                        help="file format of the processed datasets (default: csv, read by the R notebooks)")
+    parser.add_argument("--emit-excel", action="store_true",
+                        help="also write data/intermediate/processed_datasets_for_r.xlsx")
+    args = parser.parse_args()
+
     print("=" * 80)
     print("ZUAP Survey Data Cleaning for R Analysis")
     print("=" * 80)
     
     # Create cleaned dataframe and export
-    cleaned_df, processed_datasets = create_cleaned_df_for_r()
+    cleaned_df, processed_datasets = create_cleaned_df_for_r(args.fmt, args.emit_excel)
     
     if cleaned_df is not None:
         print("\n" + "=" * 80)
         print("Data cleaning and export completed successfully!")
         print("\nFiles ready for R analysis:")
         print("- Main dataset CSV: data/intermediate/cleaned_survey_for_r.csv")
-        print("- Main dataset Excel: data/intermediate/cleaned_survey_for_r.xlsx")
-        print("- Processed datasets Excel: data/intermediate/processed_datasets_for_r.xlsx")
+        print("- Main dataset Parquet: data/intermediate/cleaned_survey_for_r.parquet")
+        if args.emit_excel:
+            print("- Processed datasets Excel: data/intermediate/processed_datasets_for_r.xlsx")
         
         if processed_datasets:
-            print("\nIndividual processed datasets (CSV):")
-            for name in processed_datasets.keys():
-                print(f"- data/intermediate/{name}_for_r.csv")
+            print(f"\nIndividual processed datasets ({args.fmt.upper()}):")
+            sys.stdout.write("\n".join(f"- data/intermediate/{name}_for_r.{args.fmt}" for name in processed_datasets) + "\n")
         
         print("\n" + "=" * 80)
         print("Usage in R:")
@@ -687,14 +744,19 @@ def main():
         print("library(readr)")
         print("df <- read_csv('data/intermediate/cleaned_survey_for_r.csv')")
         print("\n# Load specific processed datasets")
-        print("temporal_data <- read_csv('data/intermediate/temporal_analysis_for_r.csv')")
-        print("transport_data <- read_csv('data/intermediate/transportation_mode_for_r.csv')")
+        if args.fmt == "parquet":
+            print("temporal_data <- arrow::read_parquet('data/intermediate/temporal_analysis_for_r.parquet')")
+            print("transport_data <- arrow::read_parquet('data/intermediate/transportation_mode_for_r.parquet')")
+        else:
+            print("temporal_data <- read_csv('data/intermediate/temporal_analysis_for_r.csv')")
+            print("transport_data <- read_csv('data/intermediate/transportation_mode_for_r.csv')")
         print("# ... and so on for other datasets")
         print("=" * 80)
     else:
         print("\n" + "=" * 80)
         print("Data cleaning failed. Please check the error messages above.")
         print("=" * 80)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -8,6 +8,140 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import re
+import hashlib
+from functools import lru_cache
+
+
+#Establishment types, matched case-insensitively in the economic activity answer
+EST_TYPES = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
+EST_CANON = {t.lower(): t for t in EST_TYPES}
+EST_REGEX = re.compile('(' + '|'.join(map(re.escape, EST_CANON)) + ')')
+EST_DTYPE = pd.CategoricalDtype(sorted(EST_TYPES))
+
+#Supply days in week order, with their English names
+DAYS = {'Lunes': 'Monday', 'Martes': 'Tuesday', 'Miércoles': 'Wednesday', 'Jueves': 'Thursday',
+        'Viernes': 'Friday', 'Sábado': 'Saturday', 'Domingo': 'Sunday'}
+
+#Plot style, set once for every figure
+sns.set_style("whitegrid")
+
+#Segments below this share are left without a percentage label
+LABEL_MIN_SHARE = 0.05
+
+#Any answer containing 'ning' (ninguno, ninguna) means 'No'
+NING_RE = re.compile(r".*ning.*", re.IGNORECASE)
+
+#Free-text answers unified into the plotted categories
+TO_UNIFY_EQUIPEMENT = {'Caminata': 'Manual workforce', 'Na': 'No', '1': 'No', 'Camina': 'Manual workforce',
+                       'Parqueadero de uso interno': 'No', 'Al hombro': 'Manual workforce', 'Descargue a mano': 'Manual workforce',
+                       'no posee': 'No', 'Personal externo': 'Manual workforce', 'Parqueadero para clientes': 'No',
+                       'A mano': 'Manual workforce', 'La misma persona la carga en sus manos': 'Manual workforce',
+                       'No hay bodega': 'No', 'Las personas lo llevan cargados': 'Manual workforce',
+                       'No se requiere por el volumen': 'No', 'No aplica': 'No', 'No es necesario entra oaquete manual': 'No',
+                       'No se requiere lis paquetes vson pequeños sebtraen a mano': 'No', 'Caminando': 'Manual workforce',
+                       'Cajas': 'No', 'Carretilla entra': 'Carretilla', 'Bahía': 'No', np.nan: 'No', 'no': 'No',
+                       'Escaleras eléctricas': 'Other', 'Escalas': 'Other', 'Porta doble': 'Other', 'Montacargas': 'Loading Ramp',
+                       'Rampa mecánica': 'Loading Ramp', 'Gato hidráulico': 'Loading Ramp'}
+
+TO_UNIFY_SUPPLY_WEEK = {'La periodicidad es quincenal': 'Other', 'La periodicidad es mensual': 'Other'}
+
+TO_UNIFY_ONLINE = {'Motocicleta': 'Motorcycle', 'No se realizan ventas por internet': 'No deliveries',
+                   'Vehículo particular': 'Van/Car', 'Furgón': 'Small truck', 'Carreta "zorrilla"': 'Handcart',
+                   'Si se realizan ventas por internet': 'No deliveries', 'Caminata': 'Walking',
+                   'Mostrador': 'No deliveries', np.nan: 'No deliveries', 'No': 'No deliveries',
+                   'Cliente recoje en negocio': 'No deliveries', 'No se realiza': 'No deliveries',
+                   'Bicicleta normal': 'Bike/Cargo Bike', 'Transportadora': 'Carrier', 'Empresa transportadora': 'Carrier',
+                   'Transportadoras': 'Carrier', 'Realizan venta por Internet': 'No deliveries',
+                   'cliente recoge': 'No deliveries', 'Servicio de mensajería': 'Carrier', 'Camioneta': 'Van/Car',
+                   'Bicicleta de carga': 'Bike/Cargo Bike', 'Servicios de mensajería': 'Carrier',
+                   'Novse hace envíos': 'No deliveries', 'Na': 'No deliveries', 'Trnasportadora': 'Carrier',
+                   'Rappifavor': 'Carrier', 'Mensajería contratada': 'Carrier', 'Van': 'Van/Car'}
+
+TO_UNIFY_DELIVERY = {'Motocicleta': 'Motorcycle', 'No se realizan domicilios': 'No deliveries', 'Furgón': 'Van/Car',
+                     'Carreta "zorrilla"': 'Handcart', 'Caminata': 'Walking', 'Vehículo particular': 'Van/Car', np.nan: 'No deliveries',
+                     'Van': 'Van/Car', 'Carro particular': 'Van/Car', 'Transportadora': 'Carrier',
+                     'Empresa transportadora': 'Carrier', 'Servicio de mensajería': 'Carrier', 'Servicios de mensajería': 'Carrier',
+                     'Camioneta': 'Van/Car', 'Bicicleta normal': 'Bike/Cargo Bike', 'Bicicleta de carga': 'Bike/Cargo Bike',
+                     'No aplica': 'No deliveries', 'No se hacen envíos': 'No deliveries', 'Na': 'No deliveries', 'No': 'No deliveries',
+                     'Trasnportadora': 'Carrier', 'Transportadoras': 'Carrier', 'Mensajeria contratada': 'Carrier',
+                     'Motocarga gasolina': 'Threewheeler'}
+
+@lru_cache(maxsize=16)
+def _greys(n_colors):
+
+    return sns.color_palette("Greys", n_colors=n_colors)
+
+def _show_and_close(fig):
+
+    #Show the figure and free its canvas right away instead of keeping every figure alive
+    plt.show()
+    plt.close(fig)
+
+def _tag_est_type(economic_activity_lc):
+
+    return economic_activity_lc.str.extract(EST_REGEX, expand=False).map(EST_CANON).astype(EST_DTYPE)
+
+def _keyword_dummies(answers, keywords):
+
+    #Keywords are searched once per distinct (lowercased) answer, then spread to the rows through the category codes
+    answers = answers.astype('category')
+    table = np.zeros((len(answers.cat.categories) + 1, len(keywords)), dtype=np.int32)
+    for i, answer in enumerate(answers.cat.categories):
+        table[i] = [word in answer for word in keywords]
+
+    #Missing answers have code -1, which picks the all-zero last row
+    return pd.DataFrame(table[answers.cat.codes.to_numpy()], index=answers.index, columns=keywords)
+
+def _clean_answers(answers, missing):
+
+    #Strip the answers and turn the 'ning' ones into 'No' once per distinct answer, then spread them through the category codes
+    answers = answers.astype('category')
+    cleaned = [('No' if NING_RE.search(answer) else answer.strip()) if isinstance(answer, str) else missing
+               for answer in answers.cat.categories]
+
+    #Missing answers have code -1, which picks the trailing missing value
+    return pd.Series(np.array(cleaned + [missing], dtype=object)[answers.cat.codes.to_numpy()], index=answers.index)
+
+def _split_dummies(answers, to_unify=None):
+
+    #One indicator column per comma-separated answer, merging the columns unified by to_unify
+    dummies = answers.str.replace(r',\s*', ',', regex=True).str.get_dummies(sep=',')
+    if to_unify:
+        dummies = dummies.T.groupby(lambda answer: to_unify.get(answer, answer)).sum().T
+
+    return dummies
+
+def _count_by_est_type(dummies, est_type, employees):
+
+    #Answers per type of establishment, over the establishments that reported employees,
+    #keeping only the answers given by some tagged establishment
+    counted = employees.notna()
+    df = dummies[counted].groupby(est_type[counted], observed=True).sum()
+
+    return df.loc[:, df.any()]
+
+def _share_by_est_type(df, col):
+
+    #Share of each answer per type of establishment, over the establishments that reported employees
+    answered = df[df['employees'].notna()]
+    est_codes = answered['est_type'].cat.codes.to_numpy()
+    answers = answered[col].astype('category')
+    codes = answers.cat.codes.to_numpy()
+
+    #Count (type, answer) pairs straight on the category codes, skipping missing ones (code -1)
+    keep = (est_codes >= 0) & (codes >= 0)
+    counts = np.zeros((len(EST_DTYPE.categories), len(answers.cat.categories)), dtype=np.int32)
+    np.add.at(counts, (est_codes[keep], codes[keep]), 1)
+
+    #Keep the observed types and answers only
+    rows, cols = counts.any(axis=1), counts.any(axis=0)
+    counts = counts[rows][:, cols]
+
+    return pd.DataFrame((counts / counts.sum(axis=1, keepdims=True)).astype(np.float32),
+                        index=pd.Index(EST_DTYPE.categories[rows], name='est_type'),
+                        columns=pd.Index(answers.cat.categories[cols], name=col))
 
 
 # In[2]:
@@ -15,7 +149,13 @@ import numpy as np
 
 def dataframe_cleaning(path):
 
-    df = pd.read_excel(path)
+    #Reuse the cleaned copy cached next to the workbook while it is newer than the workbook,
+    #keyed on this script so any change to col_out or the renames writes a fresh copy
+    with open(__file__, 'rb') as f:
+        code_key = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    cache = f"{path}.{code_key}.clean.pkl"
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return pd.read_pickle(cache)
 
     #Non informative columns that won´t be considered in the analysis  
     col_out = ['id', 'db', 'Marca temporal', 'Correo electrónico', 'Teléfono de contacto','Ir al fin de la encuesta.', 'Nombre de la empresa', 
@@ -46,7 +186,11 @@ def dataframe_cleaning(path):
                 '¿Cuántas veces por semana se realizan actividades para promover la actividad física?',
                 '¿Conoce usted el Decreto No 1790 de noviembre 20 de 2012 (Decreto de Zona Amarilla o de cargue y descargue en el centro de la ciudad)?']
 
-    df = df.drop(col_out, axis = 1)
+    #Skip them while reading instead of parsing and then dropping them (calamine is much faster, openpyxl is the fallback)
+    try:
+        df = pd.read_excel(path, engine = 'calamine', usecols = lambda c: c not in col_out)
+    except ImportError:
+        df = pd.read_excel(path, engine = 'openpyxl', usecols = lambda c: c not in col_out)
 
     #Lowercase column names
     df.columns = df.columns.str.lower()
@@ -86,6 +230,8 @@ def dataframe_cleaning(path):
 
     df = df.rename(columns = col_name)
 
+    df.to_pickle(cache)
+
     return df
 
 
@@ -96,6 +242,13 @@ def dataframe_cleaning(path):
 path=r"C:\Users\cgranadamunoz\OneDrive - Universidad Nacional de Colombia\UCC - General\CBD_MDE_2025\data\raw\03. Resultados_encuesta_logistica_ZUAP_20220927_v1.xlsx"
 df = dataframe_cleaning(path)
 
+#Lowercase the answers searched for keywords once for every plot
+df['economic_activity_lc'] = df['economic_activity'].str.lower()
+df['supply_unloading_lc'] = df['supply_unloading'].str.lower()
+
+#Identify type of commerce once for every plot
+df['est_type'] = _tag_est_type(df['economic_activity_lc'])
+
 
 # # Analysis and Plots
 
@@ -105,31 +258,17 @@ df = dataframe_cleaning(path)
 # Function to compute temporal analysis
 def temporal_analysis(df):
 
-    # Keep relevant columns
-    df = df[['supply_day', 'supply_schedule', 'employees']]
-
     # Replace 'a' for 'to'
-    df['supply_schedule'] = df['supply_schedule'].str.replace('a', 'to')
-
-    # Explode supply days
-    df['supply_day'] = df['supply_day'].str.split(',\s*')
-    df = df.explode('supply_day')
+    schedule = df['supply_schedule'].str.replace('a', 'to')
 
-    # Explode supply schedule
-    df['supply_schedule'] = df['supply_schedule'].str.split(',\s*')
-    df = df.explode('supply_schedule').reset_index(drop=True)
+    # Indicator columns of supply days (in week order, holidays left out) and schedules
+    days = _split_dummies(df['supply_day']).reindex(columns=list(DAYS), fill_value=0)
+    schedules = _split_dummies(schedule)
 
-    # Groupby to compute heatmap
-    df = df.groupby(['supply_day', 'supply_schedule']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df[df['supply_day'] != 'Festivos']
-    df = df.pivot(index='supply_schedule', columns='supply_day', values='frequency').fillna(0)
-
-    rename = {'Domingo': 'Sunday', 'Jueves': 'Thursday', 'Lunes': 'Monday', 'Martes': 'Tuesday',
-              'Miércoles': 'Wednesday', 'Sábado': 'Saturday', 'Viernes': 'Friday'}
-    df.rename(columns=rename, inplace=True)
-
-    # Reorder columns
-    df = df[['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']]
+    # Co-occurrence counts to compute heatmap
+    counts = schedules.to_numpy(dtype=np.int32).T @ days.to_numpy(dtype=np.int32)
+    df = pd.DataFrame(counts, index=schedules.columns, columns=list(DAYS.values()))
+    df = df.loc[df.any(axis=1)]
 
     temporal_variation = sns.heatmap(df, cmap='Blues', linewidths=.3)
 
@@ -139,9 +278,7 @@ def temporal_analysis(df):
 # In[6]:
 
 
-heatmap = temporal_analysis(df)
-
-heatmap
+_show_and_close(temporal_analysis(df).figure)
 
 
 # In[7]:
@@ -151,22 +288,14 @@ heatmap
 def transportation_mode(df):
 
     # Keep relevant columns
-    df = df[['economic_activity', 'supply_unloading', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    df = df[['est_type', 'supply_unloading_lc', 'employees']]
 
     # Identify type of transportation mode
     transp_mode = ['camión', 'motocicleta', 'bicicleta', 'carreta', 'particular']
-    df['transp_type'] = df['supply_unloading'].apply(lambda x: [word for word in transp_mode if word.lower() in x.lower()])
-
-    # Explode transportation mode
-    df = df.explode('transp_type').reset_index(drop=True)
+    dummies = _keyword_dummies(df['supply_unloading_lc'], sorted(transp_mode))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'transp_type']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='transp_type', values='frequency').fillna(0)
+    # Count to compute stacked bar plot
+    df = _count_by_est_type(dummies, df['est_type'], df['employees'])
     df = df.div(df.sum(axis=1), axis=0)
 
     # Rename columns and indexes
@@ -182,22 +311,14 @@ def transportation_mode(df):
 def unloading_location(df):
 
     # Keep relevant columns
-    df = df[['economic_activity', 'supply_unloading', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    df = df[['est_type', 'supply_unloading_lc', 'employees']]
 
     # Identify how is the unloading
     unloading = ['sobre la vía', 'sobre el andén', 'bahía', 'internamente', 'vías aledañas', 'parqueadero']
-    df['unloading_location'] = df['supply_unloading'].apply(lambda x: [word for word in unloading if word.lower() in x.lower()])
-
-    # Explode unloading location
-    df = df.explode('unloading_location').reset_index(drop=True)
+    dummies = _keyword_dummies(df['supply_unloading_lc'], sorted(unloading))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'unloading_location']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='unloading_location', values='frequency').fillna(0)
+    # Count to compute stacked bar plot
+    df = _count_by_est_type(dummies, df['est_type'], df['employees'])
     df = df.div(df.sum(axis=1), axis=0)
 
     # Rename columns and indexes
@@ -213,38 +334,15 @@ def unloading_location(df):
 ########################## Type of Establishment vs Unloading Equipement
 def unloading_equipement(df):
 
-    # Keep relevant columns
-    df = df[['economic_activity', 'warehouse_equipement', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
     # Identify unloading equipement
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.strip()
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.replace(r".*ning.*", 'No', regex=True, case=False)
-
-    # Explode warehouse equipement
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.split(',\s*')
-    df = df.explode('warehouse_equipement')
+    equipement = _clean_answers(df['warehouse_equipement'], TO_UNIFY_EQUIPEMENT[np.nan])
 
     # Unify type of equipement
-    to_unify = {'Caminata': 'Manual workforce', 'Na': 'No', '1': 'No', 'Camina': 'Manual workforce',
-                'Parqueadero de uso interno': 'No', 'Al hombro': 'Manual workforce', 'Descargue a mano': 'Manual workforce',
-                'no posee': 'No', 'Personal externo': 'Manual workforce', 'Parqueadero para clientes': 'No',
-                'A mano': 'Manual workforce', 'La misma persona la carga en sus manos': 'Manual workforce',
-                'No hay bodega': 'No', 'Las personas lo llevan cargados': 'Manual workforce',
-                'No se requiere por el volumen': 'No', 'No aplica': 'No', 'No es necesario entra oaquete manual': 'No',
-                'No se requiere lis paquetes vson pequeños sebtraen a mano': 'No', 'Caminando': 'Manual workforce',
-                'Cajas': 'No', 'Carretilla entra': 'Carretilla', 'Bahía': 'No', np.nan: 'No', 'no': 'No',
-                'Escaleras eléctricas': 'Other', 'Escalas': 'Other', 'Porta doble': 'Other', 'Montacargas': 'Loading Ramp',
-                'Rampa mecánica': 'Loading Ramp', 'Gato hidráulico': 'Loading Ramp'}
-
-    df['warehouse_equipement'] = df['warehouse_equipement'].replace(to_unify)
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'warehouse_equipement']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='warehouse_equipement', values='frequency').fillna(0)
+    # Indicator columns of warehouse equipement (missing answers were unified while cleaning)
+    dummies = _split_dummies(equipement, TO_UNIFY_EQUIPEMENT)
+
+    # Count to compute stacked bar plot
+    df = _count_by_est_type(dummies, df['est_type'], df['employees'])
     df = df.div(df.sum(axis=1), axis=0)
 
     # Rename columns and indexes
@@ -260,21 +358,11 @@ def unloading_equipement(df):
 ########################## Type of Establishment vs Supply frequency
 def supply_frequency(df):
 
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_week', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Change names
-    to_unify = {'La periodicidad es quincenal': 'Other', 'La periodicidad es mensual': 'Other'}
-    df['supply_week'] = df['supply_week'].replace(to_unify)
+    # Keep relevant columns and change names
+    df = df[['est_type', 'employees']].assign(supply_week=df['supply_week'].map(lambda v: TO_UNIFY_SUPPLY_WEEK.get(v, v)))
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_week']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_week', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Shares to compute stacked bar plot
+    df = _share_by_est_type(df, 'supply_week')
 
     # Rename columns and indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
@@ -296,7 +384,6 @@ def supply_frequency(df):
 ############################### 
 def plots_type_of_establishments(data_dict, horizontal_plots, vertical_plots):
 
-    sns.set_style("whitegrid")
     fig, axes = plt.subplots(vertical_plots, horizontal_plots, figsize=(15, 10))
     axes = axes.flatten()
 
@@ -306,7 +393,7 @@ def plots_type_of_establishments(data_dict, horizontal_plots, vertical_plots):
         legend_title = content.get('legend_title')
 
         # Plot
-        colors = sns.color_palette("Greys", n_colors=len(proportions.columns))
+        colors = _greys(len(proportions.columns))
         bottom = pd.Series([0]*len(proportions), index=proportions.index)
 
         for i, col in enumerate(proportions.columns):
@@ -321,15 +408,8 @@ def plots_type_of_establishments(data_dict, horizontal_plots, vertical_plots):
 
             bars = ax.bar(proportions.index, proportions[col], bottom=bottom, label=col, color=colors[i])
 
-            for bar in bars:
-                height = bar.get_height()
-                if height > 0.05:
-                    ax.text(
-                        bar.get_x() + bar.get_width() / 2,
-                        bar.get_y() + height / 2,
-                        f"{height:.0%}",
-                        ha='center', va='center', fontsize=10, color='black'
-                    )
+            labels = [f"{height:.0%}" if height > LABEL_MIN_SHARE else "" for height in proportions[col]]
+            ax.bar_label(bars, labels=labels, label_type='center', fontsize=10, color='black')
             bottom += proportions[col]
 
 
@@ -350,130 +430,69 @@ def plots_type_of_establishments(data_dict, horizontal_plots, vertical_plots):
 
 
 # Compute Stacked Bar Plots
-transp_mode = transportation_mode(df)
+def supply_plots(df):
 
-unload_loca = unloading_location(df)
+    # Data Dictionary
+    plot_dict = {'a) Transportation Mode of the Supplier': {'data': transportation_mode(df), 'legend_title': 'Vehicle Type'},
+                 'b) Supplying Frequency': {'data': supply_frequency(df), 'legend_title': 'Frequency'},
+                 'a) Unloading at the Establishment': {'data': unloading_location(df), 'legend_title': 'Location'},
+                 'b) Type of Unloading Equipment': {'data': unloading_equipement(df), 'legend_title': 'Equipment'}}
 
-unload_equi = unloading_equipement(df)
+    return plots_type_of_establishments(plot_dict, 2, 2)
 
-supply_freq = supply_frequency(df)
-
-# Data Dictionary
-plot_dict = {'a) Transportation Mode of the Supplier': {'data': transp_mode, 'legend_title': 'Vehicle Type'},
-             'b) Supplying Frequency': {'data': supply_freq, 'legend_title': 'Frequency'},
-             'a) Unloading at the Establishment': {'data': unload_loca, 'legend_title': 'Location'},
-              'b) Type of Unloading Equipment': {'data': unload_equi, 'legend_title': 'Equipment'}}
-
-plots = plots_type_of_establishments(plot_dict, 2, 2)
+_show_and_close(supply_plots(df))
 
 
 # In[10]:
 
 
-def warehouse_ownership(df):
-
-    # Keep relevant columns
-    df = df[['economic_activity', 'warehouse', 'employees']]
+def _warehouse_table(df, col, rename_cols, order=None):
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'warehouse']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='warehouse', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Shares to compute stacked bar plot
+    df = _share_by_est_type(df, col)
 
     # Rename columns and indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
     df.rename(index=rename, inplace=True)
+    df.rename(columns=rename_cols, inplace=True)
 
-    rename1 = {'Externo, alquilado': 'External (Rented)',
-               'Externo, compartido con otros comercios': 'External (Shared)',
-               'Externo, propio': 'External (Own)',
-               'Interno': 'Internal',
-               'No': 'None'}
-    df.rename(columns=rename1, inplace=True)
-
-    return df
-
-def warehouse_in_zuap(df):
+    return df if order is None else df[order]
 
-    # Keep relevant columns
-    df = df[['economic_activity', 'zuap_warehouse', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'zuap_warehouse']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='zuap_warehouse', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
-
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
-
-    rename1 = {'Sí': 'Yes'}
-    df.rename(columns=rename1, inplace=True)
-
-    df = df[['Yes', 'No']]
-
-    return df
+#Warehouse answers, in English
+WAREHOUSE_RENAME = {'Externo, alquilado': 'External (Rented)',
+                    'Externo, compartido con otros comercios': 'External (Shared)',
+                    'Externo, propio': 'External (Own)',
+                    'Interno': 'Internal',
+                    'No': 'None'}
 
 
 # In[11]:
 
 
-warehouse = warehouse_ownership(df)
+def warehouse_plots(df):
 
-warehouse_zuap = warehouse_in_zuap(df)
+    # Data Dictionary
+    plot_dict = {'a) Type of Warehouse Usage Scheme': {'data': _warehouse_table(df, 'warehouse', WAREHOUSE_RENAME), 'legend_title': 'Warehouse type'},
+                 'b) Warehouse Location': {'data': _warehouse_table(df, 'zuap_warehouse', {'Sí': 'Yes'}, ['Yes', 'No']), 'legend_title': 'In ZUAP'}}
 
-# Data Dictionary
-plot_dict1 = {'a) Type of Warehouse Usage Scheme': {'data': warehouse, 'legend_title': 'Warehouse type'},
-             'b) Warehouse Location': {'data': warehouse_zuap, 'legend_title': 'In ZUAP'}}
+    return plots_type_of_establishments(plot_dict, 2, 1)
 
-plots1 = plots_type_of_establishments(plot_dict1, 2, 1)
+_show_and_close(warehouse_plots(df))
 
 
 # In[12]:
 
 
-def e_commerce_deliveries(df):
+def _delivery_table(df, col, to_unify):
 
-    # Keep relevant columns
-    df = df[['economic_activity', 'online_trans_mode', 'employees']]
+    # Identify delivery modes
+    trans_mode = _clean_answers(df[col], to_unify[np.nan])
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    # Indicator columns of delivery modes (missing answers were unified while cleaning)
+    dummies = _split_dummies(trans_mode, to_unify)
 
-    # Identify unloading equipement
-    df['online_trans_mode'] = df['online_trans_mode'].str.strip()
-    df['online_trans_mode'] = df['online_trans_mode'].str.replace(r".*ning.*", 'No', regex=True, case=False)
-
-    # Explode warehouse equipement
-    df['online_trans_mode'] = df['online_trans_mode'].str.split(',\s*')
-    df = df.explode('online_trans_mode')
-
-    to_unify = {'Motocicleta': 'Motorcycle', 'No se realizan ventas por internet': 'No deliveries',
-                'Vehículo particular': 'Van/Car', 'Furgón': 'Small truck', 'Carreta "zorrilla"': 'Handcart',
-               'Si se realizan ventas por internet': 'No deliveries', 'Caminata': 'Walking',
-               'Mostrador': 'No deliveries', np.nan: 'No deliveries', 'No': 'No deliveries',
-               'Cliente recoje en negocio': 'No deliveries', 'No se realiza': 'No deliveries',
-               'Bicicleta normal': 'Bike/Cargo Bike', 'Transportadora': 'Carrier', 'Empresa transportadora': 'Carrier',
-               'Transportadoras': 'Carrier', 'Realizan venta por Internet': 'No deliveries',
-               'cliente recoge': 'No deliveries', 'Servicio de mensajería': 'Carrier', 'Camioneta': 'Van/Car',
-               'Bicicleta de carga': 'Bike/Cargo Bike', 'Servicios de mensajería': 'Carrier',
-               'Novse hace envíos': 'No deliveries', 'Na': 'No deliveries', 'Trnasportadora': 'Carrier',
-               'Rappifavor': 'Carrier', 'Mensajería contratada': 'Carrier', 'Van': 'Van/Car'}
-
-    df['online_trans_mode'] = df['online_trans_mode'].replace(to_unify)
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'online_trans_mode']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='online_trans_mode', values='frequency').fillna(0)
+    # Count to compute stacked bar plot
+    df = _count_by_est_type(dummies, df['est_type'], df['employees'])
     df = df.div(df.sum(axis=1), axis=0)
 
     # Rename columns and indexes
@@ -483,99 +502,27 @@ def e_commerce_deliveries(df):
     return df
 
 
-# In[13]:
-
-
-def traditional_deliveries(df):
-
-   # Keep relevant columns
-   df = df[['economic_activity', 'delivery_transp_mode', 'employees']]
-
-   # Identify type of commerce
-   est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-   df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-   # Identify unloading equipement
-   df['delivery_transp_mode'] = df['delivery_transp_mode'].str.strip()
-   df['delivery_transp_mode'] = df['delivery_transp_mode'].str.replace(r".*ning.*", 'No', regex=True, case=False)
-
-   # Explode warehouse equipement
-   df['delivery_transp_mode'] = df['delivery_transp_mode'].str.split(',\s*')
-   df = df.explode('delivery_transp_mode')
-
-   to_unify = {'Motocicleta': 'Motorcycle', 'No se realizan domicilios': 'No deliveries', 'Furgón': 'Van/Car',
-               'Carreta "zorrilla"': 'Handcart', 'Caminata': 'Walking', 'Vehículo particular': 'Van/Car', np.nan: 'No deliveries',
-               'Van': 'Van/Car', 'Carro particular': 'Van/Car', 'Transportadora': 'Carrier',
-               'Empresa transportadora': 'Carrier', 'Servicio de mensajería': 'Carrier', 'Servicios de mensajería': 'Carrier',
-               'Camioneta': 'Van/Car', 'Bicicleta normal': 'Bike/Cargo Bike', 'Bicicleta de carga': 'Bike/Cargo Bike',
-               'No aplica': 'No deliveries', 'No se hacen envíos': 'No deliveries', 'Na': 'No deliveries', 'No': 'No deliveries',
-               'Trasnportadora': 'Carrier', 'Transportadoras': 'Carrier', 'Mensajeria contratada': 'Carrier',
-                'Motocarga gasolina': 'Threewheeler'}
-
-   df['delivery_transp_mode'] = df['delivery_transp_mode'].replace(to_unify)
-
-   # Groupby to compute stacked bar plot
-   df = df.groupby(['est_type', 'delivery_transp_mode']).count().rename(columns={'employees': 'frequency'}).reset_index()
-   df = df.pivot(index='est_type', columns='delivery_transp_mode', values='frequency').fillna(0)
-   df = df.div(df.sum(axis=1), axis=0)
-
-   # Rename columns and indexes
-   rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-   df.rename(index=rename, inplace=True)
-
-   return df
-
-
 # In[14]:
 
 
-deliveries = traditional_deliveries(df)
+def delivery_plots(df):
 
-online_deliveries = e_commerce_deliveries(df)
+    # Data Dictionary
+    plot_dict = {'a) Traditional Deliveries': {'data': _delivery_table(df, 'delivery_transp_mode', TO_UNIFY_DELIVERY), 'legend_title': 'Vehicle Type'},
+                 'b) E-Commerce Deliveries': {'data': _delivery_table(df, 'online_trans_mode', TO_UNIFY_ONLINE), 'legend_title': 'Vehicle Type'}}
 
-# Data Dictionary
-plot_dict2 = {'a) Traditional Deliveries': {'data': deliveries, 'legend_title': 'Vehicle Type'},
-              'b) E-Commerce Deliveries': {'data': online_deliveries, 'legend_title': 'Vehicle Type'}}
+    return plots_type_of_establishments(plot_dict, 2, 1)
 
-plots2 = plots_type_of_establishments(plot_dict2, 2, 1)
+_show_and_close(delivery_plots(df))
 
 
 # In[15]:
 
 
-def supply_perception(df):
-
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_safety_percep', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+def _perception_table(df, col):
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_safety_percep']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_safety_percep', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
-
-    # Rename columns and indexes
-    rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
-    df.rename(index=rename, inplace=True)
-
-    return df
-
-def bike_perception(df):
-
-    # Keep relevant columns
-    df = df[['economic_activity', 'supply_bic_safety_perception', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
-
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_bic_safety_perception']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_bic_safety_perception', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Shares to compute stacked bar plot
+    df = _share_by_est_type(df, col)
 
     # Rename columns and indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
@@ -587,13 +534,13 @@ def bike_perception(df):
 # In[16]:
 
 
-supply_perception = supply_perception(df)
+def perception_plots(df):
 
-bike_perception = bike_perception(df)
+    # Data Dictionary
+    plot_dict = {'a) Safety Perception about Urban Deliveries': {'data': _perception_table(df, 'supply_safety_percep'), 'legend_title': 'Scale'},
+                 'b) Safety Perception about Cargo Bikes Deliveries': {'data': _perception_table(df, 'supply_bic_safety_perception'), 'legend_title': 'Scale'}}
 
-# Data Dictionary
-plot_dict3 = {'a) Safety Perception about Urban Deliveries': {'data': supply_perception, 'legend_title': 'Scale'},
-              'b) Safety Perception about Cargo Bikes Deliveries': {'data': bike_perception, 'legend_title': 'Scale'}}
+    return plots_type_of_establishments(plot_dict, 1, 2)
 
-plots3 = plots_type_of_establishments(plot_dict3, 1, 2)
+_show_and_close(perception_plots(df))
 
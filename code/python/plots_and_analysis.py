@@ -8,6 +8,44 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import re
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+#Establishment types, matched case-insensitively in the economic activity answer
+EST_TYPES = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
+EST_REGEX = re.compile('(' + '|'.join(map(re.escape, EST_TYPES)) + ')', re.IGNORECASE)
+EST_CANON = {t.lower(): t for t in EST_TYPES}
+
+#Low-cardinality answers, stored as categoricals once cleaned
+CATEGORY_COLUMNS = ['economic_activity', 'supply_unloading', 'warehouse_equipement', 'supply_week', 'warehouse',
+                    'supply_day', 'supply_schedule', 'main_products']
+
+#Any answer containing 'ning' (ninguno, ninguna) means 'No'
+NING_RE = re.compile(r".*ning.*", re.IGNORECASE)
+
+#Separator of multiple answers, and the standalone 'a' of schedules such as '6 a 8'
+COMMA_RE = re.compile(r",\s*")
+A_TO_RE = re.compile(r"\ba\b")
+
+#Keywords searched in the (lowercased) unloading answer
+TRANSP_REGEX = re.compile('|'.join(map(re.escape, ['camión', 'motocicleta', 'bicicleta', 'carreta', 'particular'])))
+UNLOADING_REGEX = re.compile('|'.join(map(re.escape, ['sobre la vía', 'sobre el andén', 'bahía', 'internamente',
+                                                       'vías aledañas', 'parqueadero'])))
+
+#Plot style, set once for every figure
+sns.set_style("whitegrid")
+
+@lru_cache(maxsize=16)
+def _greys(n_colors):
+
+    return sns.color_palette("Greys", n_colors=n_colors)
+
+def _tag_est_type(economic_activity):
+
+    return economic_activity.str.extract(EST_REGEX, expand=False).str.lower().map(EST_CANON)
 
 
 # In[2]:
@@ -15,7 +53,13 @@ import numpy as np
 
 def dataframe_cleaning(path):
 
-    df = pd.read_excel(path)
+    #Reuse the cleaned copy cached next to the workbook while it is newer than the workbook,
+    #keyed on this script so any change to the cleaning writes a fresh copy
+    with open(__file__, 'rb') as f:
+        code_key = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    cache = Path(f"{path}.{code_key}.plots.pkl")
+    if cache.exists() and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return pd.read_pickle(cache)
 
     #Non informative columns that won´t be considered in the analysis  
     col_out = ['id', 'db', 'Marca temporal', 'Correo electrónico', 'Teléfono de contacto','Ir al fin de la encuesta.', 'Nombre de la empresa', 
@@ -46,7 +90,11 @@ def dataframe_cleaning(path):
                 '¿Cuántas veces por semana se realizan actividades para promover la actividad física?',
                 '¿Conoce usted el Decreto No 1790 de noviembre 20 de 2012 (Decreto de Zona Amarilla o de cargue y descargue en el centro de la ciudad)?']
 
-    df = df.drop(col_out, axis = 1)
+    #Skip them while reading instead of parsing and then dropping them (calamine is much faster, openpyxl is the fallback)
+    try:
+        df = pd.read_excel(path, engine = 'calamine', usecols = lambda c: c not in col_out)
+    except ImportError:
+        df = pd.read_excel(path, engine = 'openpyxl', usecols = lambda c: c not in col_out)
 
     #Lowercase column names
     df.columns = df.columns.str.lower()
@@ -86,6 +134,18 @@ def dataframe_cleaning(path):
 
     df = df.rename(columns = col_name)
 
+    #Employees only needs a nullable 32-bit integer
+    df['employees'] = df['employees'].astype('Int32')
+
+    #Arrow-backed strings for the text-only columns (mixed ones such as supply_week keep their numbers)
+    text = [c for c in df.select_dtypes('object').columns if pd.api.types.infer_dtype(df[c], skipna=True) == 'string']
+    df[text] = df[text].astype('string[pyarrow]')
+
+    #Repeated answers become integer codes over a small set of categories
+    df[CATEGORY_COLUMNS] = df[CATEGORY_COLUMNS].astype('category')
+
+    df.to_pickle(cache)
+
     return df
 
 
@@ -94,7 +154,6 @@ def dataframe_cleaning(path):
 
 import pandas as pd
 import numpy as np
-from pathlib import Path
 
 # ── locate repo root (assumes your .ipynb sits two levels below CBD_MDE_2025) ──
 project_root = Path.cwd().resolve().parents[1]
@@ -112,6 +171,10 @@ print("Data file:", data_file)
 path = data_file
 df = dataframe_cleaning(path)
 
+#Identify type of commerce and lowercase the unloading answers once for every plot
+df['est_type'] = _tag_est_type(df['economic_activity'])
+df['supply_unloading_lc'] = df['supply_unloading'].str.lower()
+
 
 # In[5]:
 
@@ -127,24 +190,20 @@ df.columns
 # Function to compute temporal analysis
 def temporal_analysis(df):
 
-    # Keep relevant columns
-    df = df[['supply_day', 'supply_schedule', 'employees']]
-
-    # Replace 'a' for 'to'
-    df['supply_schedule'] = df['supply_schedule'].str.replace('a', 'to')
+    # Keep relevant columns of the establishments that reported employees, with the answers as Arrow-backed strings
+    df = df.loc[df['employees'].notna(), ['supply_day', 'supply_schedule']].astype({'supply_day': 'string[pyarrow]',
+                                                                                    'supply_schedule': 'string[pyarrow]'})
 
-    # Explode supply days
-    df['supply_day'] = df['supply_day'].str.split(',\s*')
-    df = df.explode('supply_day')
+    # Replace the standalone 'a' for 'to' (not every letter 'a' inside words)
+    df['supply_schedule'] = df['supply_schedule'].str.replace(A_TO_RE, 'to', regex=True)
 
-    # Explode supply schedule
-    df['supply_schedule'] = df['supply_schedule'].str.split(',\s*')
-    df = df.explode('supply_schedule').reset_index(drop=True)
+    # Split supply days and schedules, then explode both
+    df['supply_day'] = df['supply_day'].str.split(COMMA_RE)
+    df['supply_schedule'] = df['supply_schedule'].str.split(COMMA_RE)
+    df = df.explode('supply_day').explode('supply_schedule').reset_index(drop=True)
 
-    # Groupby to compute heatmap
-    df = df.groupby(['supply_day', 'supply_schedule']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df[df['supply_day'] != 'Festivos']
-    df = df.pivot(index='supply_schedule', columns='supply_day', values='frequency').fillna(0)
+    # Crosstab to compute heatmap
+    df = pd.crosstab(df['supply_schedule'], df['supply_day']).drop(columns='Festivos', errors='ignore')
 
     rename = {'Domingo': 'Sunday', 'Jueves': 'Thursday', 'Lunes': 'Monday', 'Martes': 'Tuesday',
               'Miércoles': 'Wednesday', 'Sábado': 'Saturday', 'Viernes': 'Friday'}
@@ -173,23 +232,17 @@ heatmap
 def transportation_mode(df):
 
     # Keep relevant columns
-    df = df[['economic_activity', 'supply_unloading', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    df = df.loc[:, ['est_type', 'supply_unloading_lc']].copy(deep=False)
 
     # Identify type of transportation mode
-    transp_mode = ['camión', 'motocicleta', 'bicicleta', 'carreta', 'particular']
-    df['transp_type'] = df['supply_unloading'].apply(lambda x: [word for word in transp_mode if word.lower() in x.lower()])
+    df['transp_type'] = df['supply_unloading_lc'].str.findall(TRANSP_REGEX)
 
-    # Explode transportation mode
-    df = df.explode('transp_type').reset_index(drop=True)
+    # Explode transportation mode, counting each mode once per answer
+    df = df.explode('transp_type')
+    df = df[~df.reset_index().duplicated().to_numpy()].reset_index(drop=True)
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'transp_type']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='transp_type', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Shares to compute stacked bar plot (build_all_tables keeps the establishments that reported employees)
+    df = pd.crosstab(df['est_type'], df['transp_type'], normalize='index')
 
     # Rename columns and indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
@@ -204,23 +257,17 @@ def transportation_mode(df):
 def unloading_location(df):
 
     # Keep relevant columns
-    df = df[['economic_activity', 'supply_unloading', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    df = df.loc[:, ['est_type', 'supply_unloading_lc']].copy(deep=False)
 
     # Identify how is the unloading
-    unloading = ['sobre la vía', 'sobre el andén', 'bahía', 'internamente', 'vías aledañas', 'parqueadero']
-    df['unloading_location'] = df['supply_unloading'].apply(lambda x: [word for word in unloading if word.lower() in x.lower()])
+    df['unloading_location'] = df['supply_unloading_lc'].str.findall(UNLOADING_REGEX)
 
-    # Explode unloading location
-    df = df.explode('unloading_location').reset_index(drop=True)
+    # Explode unloading location, counting each location once per answer
+    df = df.explode('unloading_location')
+    df = df[~df.reset_index().duplicated().to_numpy()].reset_index(drop=True)
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'unloading_location']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='unloading_location', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Shares to compute stacked bar plot (build_all_tables keeps the establishments that reported employees)
+    df = pd.crosstab(df['est_type'], df['unloading_location'], normalize='index')
 
     # Rename columns and indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
@@ -236,18 +283,14 @@ def unloading_location(df):
 def unloading_equipement(df):
 
     # Keep relevant columns
-    df = df[['economic_activity', 'warehouse_equipement', 'employees']]
-
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    df = df.loc[:, ['est_type', 'warehouse_equipement']].copy(deep=False)
 
     # Identify unloading equipement
     df['warehouse_equipement'] = df['warehouse_equipement'].str.strip()
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.replace(r".*ning.*", 'No', regex=True, case=False)
+    df['warehouse_equipement'] = df['warehouse_equipement'].str.replace(NING_RE, 'No', regex=True)
 
     # Explode warehouse equipement
-    df['warehouse_equipement'] = df['warehouse_equipement'].str.split(',\s*')
+    df['warehouse_equipement'] = df['warehouse_equipement'].str.split(COMMA_RE)
     df = df.explode('warehouse_equipement')
 
     # Unify type of equipement
@@ -262,14 +305,12 @@ def unloading_equipement(df):
                 'Escaleras eléctricas': 'Other', 'Escalas': 'Other', 'Porta doble': 'Other', 'Montacargas': 'Loading Ramp',
                 'Rampa mecánica': 'Loading Ramp', 'Gato hidráulico': 'Loading Ramp'}
 
-    df['warehouse_equipement'] = df['warehouse_equipement'].replace(to_unify)
-
-
+    # Remap once per distinct answer instead of once per row (missing answers are unified as well)
+    equipement = df['warehouse_equipement'].astype('category').map(lambda answer: to_unify.get(answer, answer), na_action='ignore')
+    df['warehouse_equipement'] = equipement.astype(object).fillna(to_unify[np.nan])
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'warehouse_equipement']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='warehouse_equipement', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
+    # Shares to compute stacked bar plot (build_all_tables keeps the establishments that reported employees)
+    df = pd.crosstab(df['est_type'], df['warehouse_equipement'], normalize='index')
 
     # Rename columns and indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
@@ -285,29 +326,21 @@ def unloading_equipement(df):
 def supply_frequency(df):
 
     # Keep relevant columns
-    df = df[['economic_activity', 'supply_week', 'employees']]
+    df = df.loc[:, ['est_type', 'supply_week']].copy(deep=False)
 
-    # Identify type of commerce
-    est_types = ['Proveedor', 'Venta al detalle', 'Fabricante', 'Ventas por internet']
-    df['est_type'] = df['economic_activity'].apply(lambda x: next((word for word in est_types if word.lower() in x.lower()), None))
+    # Translate the answers before counting: they mix numbers (2-5) and text, which crosstab cannot sort
+    week_labels = {5: '5 times a week', '6 o más': '6 times or more a week', '1 vez por semana': '1 time a week',
+                   2: '2 times a week', 3: '3 times a week', 4: '4 times a week',
+                   'La periodicidad es quincenal': 'Other', 'La periodicidad es mensual': 'Other'}
+    df['supply_week'] = df['supply_week'].astype(object).map(lambda v: week_labels.get(v, str(v)), na_action='ignore')
 
-    # Change names
-    to_unify = {'La periodicidad es quincenal': 'Other', 'La periodicidad es mensual': 'Other'}
-    df['supply_week'] = df['supply_week'].replace(to_unify)
+    # Shares to compute stacked bar plot (build_all_tables keeps the establishments that reported employees)
+    df = pd.crosstab(df['est_type'], df['supply_week'], normalize='index')
 
-    # Groupby to compute stacked bar plot
-    df = df.groupby(['est_type', 'supply_week']).count().rename(columns={'employees': 'frequency'}).reset_index()
-    df = df.pivot(index='est_type', columns='supply_week', values='frequency').fillna(0)
-    df = df.div(df.sum(axis=1), axis=0)
-
-    # Rename columns and indexes
+    # Rename indexes
     rename = {'Proveedor': 'Supplier', 'Venta al detalle': 'Retailer', 'Fabricante': 'Manufacturer', 'Ventas por internet': 'E-commerce'}
     df.rename(index=rename, inplace=True)
 
-    rename1 = {5: '5 times a week', '6 o más': '6 times or more a week', '1 vez por semana': '1 time a week',
-               2: '2 times a week', 3: '3 times a week', 4: '4 times a week'}
-    df.rename(columns=rename1, inplace=True)
-
     df = df[['1 time a week', '2 times a week', '3 times a week',
              '4 times a week', '5 times a week', '6 times or more a week', 'Other']]
 
@@ -317,15 +350,18 @@ def supply_frequency(df):
 # In[17]:
 
 
-df=transp_mode = transportation_mode(df)
+########################## The four establishment tables in one pass
+def build_all_tables(df):
 
-df=unload_loca = unloading_location(df)
+    # Slice the shared columns and drop the establishments without employees once for the four tables
+    df = df.loc[df['employees'].notna(), ['est_type', 'supply_unloading_lc', 'warehouse_equipement', 'supply_week']]
 
-df=unload_equi = unloading_equipement(df)
+    return {'transp': transportation_mode(df), 'loc': unloading_location(df),
+            'equi': unloading_equipement(df), 'freq': supply_frequency(df)}
 
-df=supply_freq = supply_frequency(df)
+tables = build_all_tables(df)
 
-df.to_csv(project_root / "data" / "intermediate" / "mario_clean.csv", index=False) 
+tables['freq'].to_csv(project_root / "data" / "intermediate" / "mario_clean.csv", index=False) 
 print("Data saved to:", project_root / "data" / "intermediate" / "mario_clean.csv") 
 
 
@@ -336,7 +372,6 @@ print("Data saved to:", project_root / "data" / "intermediate" / "mario_clean.cs
 
 def plots_type_of_establishments(data_dict):
 
-    sns.set_style("whitegrid")
     fig, axes = plt.subplots(2, 2, figsize=(18, 10))
     axes = axes.flatten()
 
@@ -346,20 +381,9 @@ def plots_type_of_establishments(data_dict):
         legend_title = content.get('legend_title')
 
         # Plot
-        colors = sns.color_palette("Greys", n_colors=len(proportions.columns))
-        bottom = pd.Series([0]*len(proportions), index=proportions.index)
-
-        for i, col in enumerate(proportions.columns):
-            ax.bar(
-                proportions.index,
-                proportions[col],
-                bottom=bottom,
-                label=col,
-                color=colors[i]
-            )
-            bottom += proportions[col]
-
-            # Format plot
+        proportions.plot.bar(stacked=True, ax=ax, color=_greys(len(proportions.columns)), width=0.8, rot=0, xlabel='')
+
+        # Format plot
         ax.set_title(title, fontsize=22)
         #ax.set_xlabel("Establishment Type", fontsize=12)
         #ax.set_ylabel("Proportion", fontsize=12)
@@ -375,20 +399,13 @@ def plots_type_of_establishments(data_dict):
 # In[10]:
 
 
-# Compute Stacked Bar Plots
-transp_mode = transportation_mode(df)
-
-unload_loca = unloading_location(df)
-
-unload_equi = unloading_equipement(df)
-
-supply_freq = supply_frequency(df)
+# Stacked Bar Plots, from the tables computed above
 
 # Data Dictionary
-plot_dict = {'a) Supplier Transportation Mode': {'data': transp_mode, 'legend_title': 'Vehicle Type'},
-             'b) Supplying Frequency': {'data': supply_freq, 'legend_title': 'Supply Frequency'},
-             'c) Unloading Location': {'data': unload_loca, 'legend_title': 'Unloading Location'},
-             'd) Unloading Equipment': {'data': unload_equi, 'legend_title': 'Unloading Equipment'}}
+plot_dict = {'a) Supplier Transportation Mode': {'data': tables['transp'], 'legend_title': 'Vehicle Type'},
+             'b) Supplying Frequency': {'data': tables['freq'], 'legend_title': 'Supply Frequency'},
+             'c) Unloading Location': {'data': tables['loc'], 'legend_title': 'Unloading Location'},
+             'd) Unloading Equipment': {'data': tables['equi'], 'legend_title': 'Unloading Equipment'}}
 
 
 # In[251]: